@@ -0,0 +1,93 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import sys
+
+# package entry point: `python -m src <command> [options]`. each command imports its modules only when
+# it runs, so a short scripted run never pays for the test scenarios, the profiler, the reindex pool
+# or the server, and options after the command go to that command's own parser
+
+# command run when none is given
+DEFAULT_COMMAND = "interactive"
+
+# options that show the command overview instead of running the default command
+HELP_FLAGS = ("-h", "--help")
+
+# runs the menu on the saved state
+def run_interactive(options: List[str]) -> None:
+    from src import main
+    main.main(options, "interactive")
+
+# replays a workload file from genesis
+def run_batch(options: List[str]) -> None:
+    from src import main
+    main.main(options, "batch")
+
+# runs a seeded network simulation
+def run_simulate(options: List[str]) -> None:
+    from src import main
+    main.main(options, "simulate")
+
+# rebuilds the utxo snapshot from a block file
+def run_reindex(options: List[str]) -> None:
+    from src import main
+    main.main(options, "reindex")
+
+# serves the simulator as a json api
+def run_serve(options: List[str]) -> None:
+    from src import server
+    server.main(options)
+
+# measures cli cold-start latency
+def run_bench(options: List[str]) -> None:
+    from src import bench
+    bench.main(options)
+
+# runs the test scenarios, exiting non-zero if any fail
+def run_test(options: List[str]) -> None:
+    if options:
+        print("usage: python -m src test", file=sys.stderr)
+        sys.exit(2)
+    from test.testing import run_all_tests
+    if not run_all_tests():
+        sys.exit(1)
+
+# name -> (usage, help, handler)
+COMMANDS: Dict[str, Tuple[str, str, Callable[[List[str]], None]]] = {
+    "interactive": ("interactive [options]", "run the menu on the saved state (the default)", run_interactive),
+    "batch": ("batch FILE [options]", "replay a json lines workload from genesis", run_batch),
+    "simulate": ("simulate DAYS [options]", "run a seeded network simulation", run_simulate),
+    "reindex": ("reindex FILE [options]", "rebuild the utxo snapshot from a block file", run_reindex),
+    "serve": ("serve [options]", "serve the simulator as a json api", run_serve),
+    "bench": ("bench [options]", "measure cli cold-start latency", run_bench),
+    "test": ("test", "run the test scenarios", run_test)
+}
+
+# returns the command overview
+def usage() -> str:
+    lines = ["usage: python -m src [command] [options]", "", "bitcoin transaction simulator", "", "commands:"]
+    for usage_text, help_text, _ in COMMANDS.values():
+        lines.append(f"  {usage_text:<26} {help_text}")
+    lines.append("")
+    lines.append("run `python -m src <command> --help` for a command's options")
+    return "\n".join(lines)
+
+# runs the chosen command with the options that follow it
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in HELP_FLAGS:
+        print(usage())
+        return
+
+    # no command, or options straight away, run the default command with all of them
+    if not argv or argv[0].startswith("-"):
+        name, options = DEFAULT_COMMAND, argv
+    else:
+        name, options = argv[0], argv[1:]
+    if name not in COMMANDS:
+        print(usage(), file=sys.stderr)
+        print(f"\nerror: unknown command {name}", file=sys.stderr)
+        sys.exit(2)
+    COMMANDS[name][2](options)
+
+
+if __name__ == "__main__":
+    main()
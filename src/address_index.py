@@ -0,0 +1,92 @@
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from src.block import Block
+
+if TYPE_CHECKING:
+    from src.block_store import BlockStore, LazyBlock
+
+# direction of an address history entry
+SENT = "sent"
+RECEIVED = "received"
+
+# maps addresses to the transactions that touched them, fed one connected block at a time
+# (pass connect_block as mine_block's on_block), so no chain of blocks is kept around for it
+class AddressIndex:
+    # initializes an empty index
+    def __init__(self):
+        self.history: Dict[str, List[Tuple[int, str, str, float]]] = {}
+        self.indexed_blocks = 0
+
+    # records one transaction's effect on every address it touches
+    def index_transaction(
+        self,
+        height: int,
+        tx_id: str,
+        inputs: List[Tuple[str, float]],
+        outputs: List[Tuple[str, float]]
+    ) -> None:
+        sent: Dict[str, float] = {}
+        for owner, amount in inputs:
+            sent[owner] = sent.get(owner, 0.0) + amount
+        received: Dict[str, float] = {}
+        for address, amount in outputs:
+            received[address] = received.get(address, 0.0) + amount
+
+        for owner, amount in sent.items():
+            self.history.setdefault(owner, []).append((height, tx_id, SENT, amount))
+        for address, amount in received.items():
+            self.history.setdefault(address, []).append((height, tx_id, RECEIVED, amount))
+
+    # indexes every transaction in a block, including its coinbase
+    def connect_block(self, block: Block) -> None:
+        for tx in block.transactions:
+            inputs = [
+                (inp.owner, block.spent_utxos[(inp.prev_tx_id, inp.output_index)][0])
+                for inp in tx.inputs
+            ]
+            outputs = [(out.address, out.amount) for out in tx.outputs]
+            self.index_transaction(block.block_height, tx.tx_id, inputs, outputs)
+
+        if block.total_fees > 0:
+            self.index_transaction(block.block_height, block.coinbase_tx_id, [], [(block.miner, block.total_fees)])
+
+        self.indexed_blocks += 1
+
+    # indexes a block read back from a block file, straight from its encoded fields
+    def connect_stored_block(self, view: "LazyBlock") -> None:
+        for i in range(view.tx_count):
+            inputs = [(str(owner, "utf-8"), amount) for _, _, amount, owner in view.iter_inputs(i)]
+            outputs = [(str(address, "utf-8"), amount) for amount, address in view.iter_outputs(i)]
+            self.index_transaction(view.block_height, view.tx_id(i), inputs, outputs)
+
+        if view.total_fees > 0:
+            self.index_transaction(view.block_height, view.coinbase_tx_id, [], [(view.miner, view.total_fees)])
+
+        self.indexed_blocks += 1
+
+    # returns up to limit entries for an address, newest first, plus the cursor for the next page
+    def get_history(
+        self,
+        address: str,
+        cursor: Optional[int] = None,
+        limit: int = 50
+    ) -> Tuple[List[Tuple[int, str, str, float]], Optional[int]]:
+        entries = self.history.get(address, [])
+
+        end = len(entries) if cursor is None else min(cursor, len(entries))
+        start = max(0, end - limit)
+        page = entries[start:end]
+        page.reverse()
+
+        return page, (start if start > 0 else None)
+
+    # returns how many history entries an address has
+    def count(self, address: str) -> int:
+        return len(self.history.get(address, []))
+
+
+# builds the history of every block in a block file; block 0 holds genesis, which the live index never sees
+def index_block_store(store: "BlockStore") -> AddressIndex:
+    address_index = AddressIndex()
+    for height in range(1, len(store)):
+        address_index.connect_stored_block(store[height])
+    return address_index
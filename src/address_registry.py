@@ -0,0 +1,40 @@
+from typing import Dict, List, Optional
+
+# maps address strings to small integer ids and back
+class AddressRegistry:
+    # initializes an empty registry
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._addresses: List[str] = []
+
+    # returns the id of an address, registering it on first use
+    def intern(self, address: str) -> int:
+        address_id = self._ids.get(address)
+        if address_id is None:
+            address_id = len(self._addresses)
+            self._ids[address] = address_id
+            self._addresses.append(address)
+        return address_id
+
+    # returns the id of an address, or None if it was never registered
+    def lookup(self, address: str) -> Optional[int]:
+        return self._ids.get(address)
+
+    # returns the address for an id
+    def address(self, address_id: int) -> str:
+        return self._addresses[address_id]
+
+    # returns the number of registered addresses
+    def __len__(self) -> int:
+        return len(self._addresses)
+
+# registry shared by utxo manager, transactions and mempool, so ids agree everywhere in the process
+REGISTRY = AddressRegistry()
+
+# returns the id of an address in the shared registry
+def address_id(address: str) -> int:
+    return REGISTRY.intern(address)
+
+# returns the address for an id in the shared registry
+def address_of(address_id: int) -> str:
+    return REGISTRY.address(address_id)
@@ -0,0 +1,150 @@
+from typing import Dict, Iterator, Optional, Tuple
+from src import block
+from src.block_store import BlockStore
+from src.utxo_manager import UTXOManager
+from src.mempool import Mempool
+from src.transaction import Transaction, create_transaction, DEFAULT_FEE
+import json
+import re
+import time
+
+# replay speeds: as fast as possible, or honouring each command's "t" offset in seconds
+PACE_MAX = "max"
+PACE_RECORDED = "recorded"
+
+# transactions mined per block when a mine command doesn't say
+DEFAULT_BATCH_BLOCK_TXS = 5
+
+# yields (line number, command) for every non-blank line of a json lines workload
+def read_workload(path: str) -> Iterator[Tuple[int, dict]]:
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                command = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"line {line_number}: invalid json: {e}")
+            if not isinstance(command, dict) or "op" not in command:
+                raise ValueError(f"line {line_number}: command must be an object with an \"op\" field")
+            yield line_number, command
+
+# tallies an error message by its gist, with ids, amounts and details stripped
+def _count_reason(reasons: Dict[str, int], message: str) -> None:
+    gist = re.sub(r"\([^)]*\)|\S*[\d_]\S*", "", message.split(":")[0])
+    gist = " ".join(gist.split())
+    reasons[gist] = reasons.get(gist, 0) + 1
+
+# streams a workload file through the node and returns a summary of what happened
+def run_batch(
+    path: str,
+    utxo_manager: UTXOManager,
+    mempool: Mempool,
+    pace: str = PACE_MAX,
+    block_store: Optional[BlockStore] = None
+) -> Dict[str, object]:
+    if pace not in (PACE_MAX, PACE_RECORDED):
+        raise ValueError(f"unknown pace: {pace}")
+
+    counts = {
+        "commands": 0,
+        "created": 0,
+        "create_failed": 0,
+        "accepted": 0,
+        "rejected": 0,
+        "blocks": 0,
+        "confirmed": 0
+    }
+    rejections: Dict[str, int] = {}
+
+    start = time.perf_counter()
+    for line_number, command in read_workload(path):
+        if pace == PACE_RECORDED and "t" in command:
+            delay = start + command["t"] - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        op = command["op"]
+        counts["commands"] += 1
+
+        if op == "create_tx" or op == "submit_tx":
+            try:
+                if op == "create_tx":
+                    tx = create_transaction(
+                        command["sender"],
+                        command["recipient"],
+                        command["amount"],
+                        utxo_manager,
+                        replaceable=command.get("rbf", False),
+                        fee=command.get("fee", DEFAULT_FEE),
+                        mempool=mempool if command.get("wallet", False) else None
+                    )
+                    counts["created"] += 1
+                else:
+                    tx = Transaction.from_dict(command["tx"])
+            except ValueError as e:
+                counts["create_failed"] += 1
+                _count_reason(rejections, str(e))
+                continue
+            except KeyError as e:
+                raise ValueError(f"line {line_number}: {op} is missing {e}")
+
+            success, msg = mempool.add_transaction(tx, utxo_manager)
+            if success:
+                counts["accepted"] += 1
+            else:
+                counts["rejected"] += 1
+                _count_reason(rejections, msg)
+
+        elif op == "mine":
+            mined = block.mine_block(
+                command.get("miner", "miner"),
+                mempool,
+                utxo_manager,
+                command.get("num_txs", DEFAULT_BATCH_BLOCK_TXS),
+                verbose=False,
+                block_store=block_store
+            )
+            if mined is not None:
+                counts["blocks"] += 1
+                counts["confirmed"] += len(mined.transactions)
+
+        else:
+            raise ValueError(f"line {line_number}: unknown op: {op}")
+
+    elapsed = time.perf_counter() - start
+    submitted = counts["accepted"] + counts["rejected"]
+
+    summary: Dict[str, object] = dict(counts)
+    summary["rejections"] = rejections
+    summary["elapsed_seconds"] = elapsed
+    summary["commands_per_second"] = counts["commands"] / elapsed if elapsed > 0 else 0.0
+    summary["submissions_per_second"] = submitted / elapsed if elapsed > 0 else 0.0
+    summary["confirmed_per_second"] = counts["confirmed"] / elapsed if elapsed > 0 else 0.0
+    summary["mempool_size"] = mempool.size()
+    summary["utxo_set_size"] = utxo_manager.size()
+    summary["block_height"] = block.get_current_block_height()
+    summary["utxo_set_hash"] = utxo_manager.get_set_hash()
+    return summary
+
+# returns a human-readable batch summary
+def format_summary(summary: Dict[str, object]) -> str:
+    lines = [
+        "batch summary:",
+        f"  commands: {summary['commands']} in {summary['elapsed_seconds']:.3f} s "
+        f"({summary['commands_per_second']:.1f} commands/s)",
+        f"  transactions created: {summary['created']} ({summary['create_failed']} could not be built)",
+        f"  submitted: {summary['accepted']} accepted, {summary['rejected']} rejected "
+        f"({summary['submissions_per_second']:.1f} tx/s)",
+        f"  blocks mined: {summary['blocks']} confirming {summary['confirmed']} transactions "
+        f"({summary['confirmed_per_second']:.1f} tx/s)",
+        f"  final state: height {summary['block_height']}, {summary['mempool_size']} in mempool, "
+        f"{summary['utxo_set_size']} utxos",
+        f"  utxo set hash: {summary['utxo_set_hash']}"
+    ]
+    if summary["rejections"]:
+        lines.append("  failures by reason:")
+    for reason, count in sorted(summary["rejections"].items(), key=lambda item: -item[1]):
+        lines.append(f"    {count} x {reason}")
+    return "\n".join(lines)
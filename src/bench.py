@@ -0,0 +1,161 @@
+from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+import argparse
+import compileall
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# directory holding the src package, which the measured commands run from
+REPO_ROOT = Path(__file__).parent.parent
+
+# times each startup scenario is run
+DEFAULT_RUNS = 5
+
+# modules a plain `import src.main` must leave alone: only the commands that use them load them
+LAZY_MODULES = (
+    "test.testing",
+    "src.bench",
+    "src.profiling",
+    "src.reindex",
+    "src.server",
+    "src.batch",
+    "src.simulation",
+    "src.block_store",
+    "src.metrics",
+    "cProfile",
+    "tracemalloc",
+    "multiprocessing",
+    "http.server"
+)
+
+# short scripted run replayed by the batch scenario
+SHORT_WORKLOAD = [
+    {"op": "create_tx", "sender": "alice", "recipient": "bob", "amount": 1.0},
+    {"op": "create_tx", "sender": "bob", "recipient": "charlie", "amount": 2.0},
+    {"op": "mine", "miner": "miner"},
+    {"op": "create_tx", "sender": "charlie", "recipient": "alice", "amount": 0.5}
+]
+
+# returns the wall time in seconds of each of runs fresh interpreters running a command
+def time_command(args: List[str], runs: int = DEFAULT_RUNS) -> List[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable] + args, cwd=REPO_ROOT, check=True,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        timings.append(time.perf_counter() - start)
+    return timings
+
+# returns the names of every module a fresh interpreter has loaded after importing one module
+def loaded_modules(module: str) -> List[str]:
+    script = f"import importlib, sys; importlib.import_module({module!r}); print('\\n'.join(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=REPO_ROOT, check=True, capture_output=True, text=True
+    )
+    return result.stdout.split()
+
+# returns the lazy modules an import of src.main pulled in (empty when startup stays lean)
+def eager_imports() -> List[str]:
+    loaded = set(loaded_modules("src.main"))
+    return [module for module in LAZY_MODULES if module in loaded]
+
+# times cold starts of the cli against a bare interpreter: importing the cli, printing the subcommand
+# help, and replaying a short batch workload. budget_ms, if given, caps each scenario's median time
+# over the bare interpreter
+def run_bench(runs: int = DEFAULT_RUNS, budget_ms: Optional[float] = None) -> Dict[str, object]:
+    if runs < 1:
+        raise ValueError(f"runs must be at least 1, got {runs}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workload = os.path.join(tmp, "short.jsonl")
+        with open(workload, "w") as f:
+            for command in SHORT_WORKLOAD:
+                f.write(json.dumps(command) + "\n")
+
+        scenarios: List[Tuple[str, List[str]]] = [
+            ("interpreter", ["-c", "pass"]),
+            ("import src.main", ["-c", "import src.main"]),
+            ("python -m src --help", ["-m", "src", "--help"]),
+            ("python -m src batch (short)", ["-m", "src", "batch", workload, "--no-metrics"])
+        ]
+        # deployed code starts from cached bytecode, even where PYTHONDONTWRITEBYTECODE keeps the
+        # interpreter from writing it; one untimed run of each scenario then warms the file system cache
+        compileall.compile_dir(str(REPO_ROOT / "src"), quiet=1)
+        for _, args in scenarios:
+            time_command(args, 1)
+        timings = {name: time_command(args, runs) for name, args in scenarios}
+
+    baseline = statistics.median(timings["interpreter"])
+    results = []
+    over_budget = []
+    for name, samples in timings.items():
+        median = statistics.median(samples)
+        overhead_ms = (median - baseline) * 1000
+        results.append({
+            "scenario": name,
+            "min_ms": min(samples) * 1000,
+            "median_ms": median * 1000,
+            "overhead_ms": overhead_ms
+        })
+        if budget_ms is not None and name != "interpreter" and overhead_ms > budget_ms:
+            over_budget.append(name)
+
+    return {
+        "runs": runs,
+        "python": sys.version.split()[0],
+        "results": results,
+        "budget_ms": budget_ms,
+        "over_budget": over_budget,
+        "eager_imports": eager_imports()
+    }
+
+# returns a human-readable benchmark report
+def format_report(summary: Dict[str, object]) -> str:
+    lines = [
+        f"startup benchmark ({summary['runs']} runs each, python {summary['python']}):",
+        f"  {'scenario':<30} {'min ms':>8} {'median ms':>10} {'overhead ms':>12}"
+    ]
+    for result in summary["results"]:
+        lines.append(
+            f"  {result['scenario']:<30} {result['min_ms']:>8.1f} {result['median_ms']:>10.1f} "
+            f"{result['overhead_ms']:>12.1f}"
+        )
+    if summary["eager_imports"]:
+        lines.append(f"  import src.main loaded modules it should leave lazy: {', '.join(summary['eager_imports'])}")
+    else:
+        lines.append("  import src.main leaves the test harness, profiler, reindex pool, server, batch runner, "
+                     "simulator, block store and metrics unloaded")
+    if summary["budget_ms"] is not None:
+        if summary["over_budget"]:
+            lines.append(f"  over the {summary['budget_ms']:.0f} ms budget: {', '.join(summary['over_budget'])}")
+        else:
+            lines.append(f"  every scenario within the {summary['budget_ms']:.0f} ms budget")
+    return "\n".join(lines)
+
+# parses the bench subcommand's options
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m src bench", description="measure cli cold-start latency")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="times each scenario is run")
+    parser.add_argument("--budget-ms", type=float,
+                        help="fail if a scenario's median takes longer than this over a bare interpreter")
+    return parser.parse_args(argv)
+
+# runs the benchmark and exits non-zero if startup regressed past the budget or loaded lazy modules
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    try:
+        summary = run_bench(args.runs, args.budget_ms)
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        print(f"error: benchmark failed: {e}")
+        sys.exit(1)
+
+    print(format_report(summary))
+    if summary["over_budget"] or summary["eager_imports"]:
+        sys.exit(1)
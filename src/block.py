@@ -1,22 +1,31 @@
-import sys
-from pathlib import Path
-sys.path.insert(0, str(Path(__file__).parent.parent))
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from src.transaction import Transaction
-from src.utxo_manager import UTXOManager
+from src.utxo_manager import SET_HASH_MODULUS, UTXOManager, UTXOView, utxo_hash_element
 from src.mempool import Mempool
 import time
 
 # represents a block in the blockchain
 class Block:
     # initializes a block
-    def __init__(self, block_height: int, transactions: List[Transaction], miner: str, total_fees: float):
+    def __init__(
+        self,
+        block_height: int,
+        transactions: List[Transaction],
+        miner: str,
+        total_fees: float,
+        spent_utxos: Dict[Tuple[str, int], Tuple[float, str]] = None,
+        timestamp: Optional[int] = None
+    ):
         self.block_height = block_height
-        self.timestamp = int(time.time())
+        self.timestamp = int(time.time()) if timestamp is None else timestamp
         self.transactions = transactions
         self.miner = miner
         self.total_fees = total_fees
         self.coinbase_tx_id = f"coinbase_{miner}_{block_height}_{self.timestamp}"
+        # amount and owner of every utxo the block spent, keyed by outpoint
+        self.spent_utxos = spent_utxos if spent_utxos is not None else {}
+        # utxo set hash after the block was applied
+        self.utxo_set_hash = None
     
     def __repr__(self):
         return f"block(height={self.block_height}, txs={len(self.transactions)}, miner={self.miner}, fees={self.total_fees:.8f})"
@@ -25,94 +34,146 @@ class Block:
 # global block height counter
 CURRENT_BLOCK_HEIGHT = 0
 
-# simulates mining a block
+# discards progress output when mining quietly
+def _quiet(*args) -> None:
+    pass
+
+# simulates mining a block; with a block_store (a BlockStore ending at the current height) the block is
+# appended to it before anything else sees it, and the utxo set is rolled back if the append fails
 def mine_block(
     miner_address: str,
     mempool: Mempool,
     utxo_manager: UTXOManager,
-    num_txs: int = 5
+    num_txs: int = 5,
+    verbose: bool = True,
+    timestamp: Optional[int] = None,
+    on_block: Optional[Callable[[Block], None]] = None,
+    block_store=None
 ) -> Optional[Block]:
     
     global CURRENT_BLOCK_HEIGHT
+    log = print if verbose else _quiet
+    
+    if block_store is not None and block_store.tip_height() != CURRENT_BLOCK_HEIGHT:
+        raise ValueError(
+            f"block file ends at height {block_store.tip_height()} but the chain is at {CURRENT_BLOCK_HEIGHT}"
+        )
     
-    print(f"\n{'='*60}")
-    print(f"mining block #{CURRENT_BLOCK_HEIGHT + 1}")
-    print(f"{ '='*60}")
+    log(f"\n{'='*60}")
+    log(f"mining block #{CURRENT_BLOCK_HEIGHT + 1}")
+    log(f"{ '='*60}")
     
-    selected_txs: List[Transaction] = mempool.get_top_transactions(num_txs)
+    selected_txs: List[Transaction] = mempool.select_for_block(num_txs)
     
     if not selected_txs:
-        print("no transactions available for mining.")
+        log("no transactions available for mining.")
         return None
     
-    print(f"selected {len(selected_txs)} transactions from mempool:")
+    log(f"selected {len(selected_txs)} transactions from mempool:")
     for i, tx in enumerate(selected_txs, 1):
-        print(f"  {i}. {tx.tx_id} (fee: {tx.fee:.8f} btc)")
+        log(f"  {i}. {tx.tx_id} (fee: {tx.fee:.8f} btc)")
     
-    utxo_snapshot = utxo_manager.get_snapshot()
+    # validate against a block-local view, so nothing touches the utxo set until the block is complete
+    view = UTXOView(utxo_manager)
     
     total_fees = 0.0
     successfully_applied = []
+    spent_utxos = {}
     
-    try:
-        for tx in selected_txs:
-            is_valid, msg = tx.is_valid(utxo_manager)
-            
-            if not is_valid:
-                print(f"warning: transaction {tx.tx_id} became invalid: {msg}")
-                continue
-            
-            for inp in tx.inputs:
-                try:
-                    utxo_manager.remove_utxo(inp.prev_tx_id, inp.output_index)
-                except KeyError as e:
-                    print(f"error: could not spend utxo in {tx.tx_id}: {e}")
-                    utxo_manager.load_snapshot(utxo_snapshot)
-                    print("utxo state rolled back due to error")
-                    return None
-            
-            for index, out in enumerate(tx.outputs):
-                utxo_manager.add_utxo(
-                    tx.tx_id,
-                    index,
-                    out.amount,
-                    out.address
-                )
-            
-            total_fees += tx.fee
-            successfully_applied.append(tx)
+    for tx in selected_txs:
+        is_valid, msg = tx.is_valid(view)
         
-        CURRENT_BLOCK_HEIGHT += 1
-        block_height = CURRENT_BLOCK_HEIGHT
-        coinbase_tx_id = f"coinbase_{miner_address}_{block_height}_{int(time.time())}"
+        if not is_valid:
+            log(f"warning: transaction {tx.tx_id} became invalid: {msg}")
+            continue
         
-        if total_fees > 0:
-            utxo_manager.add_utxo(
-                coinbase_tx_id,
-                0,
-                total_fees,
-                miner_address
+        for inp in tx.inputs:
+            spent_utxos[(inp.prev_tx_id, inp.output_index)] = (
+                view.get_utxo_amount(inp.prev_tx_id, inp.output_index),
+                inp.owner
             )
-            print(f"\ncoinbase created: {coinbase_tx_id}")
-            print(f"miner {miner_address} receives {total_fees:.8f} btc in fees")
-        
-        for tx in successfully_applied:
-            mempool.remove_transaction(tx.tx_id)
+            view.spend(inp.prev_tx_id, inp.output_index)
         
-        print(f"\nblock #{block_height} mined successfully!")
-        print(f"  transactions confirmed: {len(successfully_applied)}")
-        print(f"  total fees: {total_fees:.8f} btc")
-        print(f"  mempool size: {mempool.size()} transactions remaining")
-        print(f"{ '='*60}\n")
+        for index, out in enumerate(tx.outputs):
+            view.create(tx.tx_id, index, out.amount, out.address)
         
-        block = Block(block_height, successfully_applied, miner_address, total_fees)
-        return block
-        
-    except Exception as e:
-        print(f"error during mining: {e}")
-        utxo_manager.load_snapshot(utxo_snapshot)
-        print("utxo state rolled back due to error")
+        total_fees += tx.fee
+        successfully_applied.append(tx)
+    
+    block_height = CURRENT_BLOCK_HEIGHT + 1
+    if timestamp is None:
+        timestamp = int(time.time())
+    coinbase_tx_id = f"coinbase_{miner_address}_{block_height}_{timestamp}"
+    if total_fees > 0:
+        view.create(coinbase_tx_id, 0, total_fees, miner_address)
+    
+    # the set hash the block will leave behind, worked out from the view before anything is applied
+    creates = view.pending_creates()
+    hash_delta = sum(utxo_hash_element(*utxo) for utxo in creates) - sum(
+        utxo_hash_element(tx_id, index, *spent_utxos[(tx_id, index)]) for tx_id, index in view.spends
+    )
+    
+    block = Block(block_height, successfully_applied, miner_address, total_fees, spent_utxos, timestamp)
+    block.coinbase_tx_id = coinbase_tx_id
+    block.utxo_set_hash = f"{(utxo_manager.set_hash + hash_delta) % SET_HASH_MODULUS:064x}"
+    
+    # encode the record first, so a block the file format can't hold is refused with the set untouched
+    payload = None
+    if block_store is not None:
+        from src.block_store import encode_block
+        payload = encode_block(block)
+    
+    failures = utxo_manager.apply_block(view.spends, creates, hash_delta=hash_delta)
+    if failures:
+        for utxo, reason in failures:
+            log(f"error: could not apply utxo {utxo}: {reason}")
+        log("block discarded, utxo set unchanged")
         return None
+    
+    # an output that overwrote a stale one moves the hash further than the view could tell
+    if utxo_manager.get_set_hash() != block.utxo_set_hash:
+        block.utxo_set_hash = utxo_manager.get_set_hash()
+        if payload is not None:
+            payload = encode_block(block)
+    
+    if block_store is not None:
+        try:
+            block_store.append(block, payload)
+        except (OSError, ValueError):
+            # undo the block: drop what it created and restore what it spent
+            utxo_manager.apply_block(
+                [(tx_id, index) for tx_id, index, _, _ in creates],
+                [(tx_id, index, *spent_utxos[(tx_id, index)]) for tx_id, index in view.spends]
+            )
+            log("block discarded, utxo set rolled back")
+            raise
+    
+    CURRENT_BLOCK_HEIGHT = block_height
+    
+    if total_fees > 0:
+        log(f"\ncoinbase created: {coinbase_tx_id}")
+        log(f"miner {miner_address} receives {total_fees:.8f} btc in fees")
+    
+    if mempool.fee_estimator is not None:
+        mempool.fee_estimator.process_block(block_height, successfully_applied)
+    
+    evicted, adopted = mempool.remove_for_block(block, utxo_manager)
+    
+    log(f"\nblock #{block_height} mined successfully!")
+    log(f"  transactions confirmed: {len(successfully_applied)}")
+    log(f"  total fees: {total_fees:.8f} btc")
+    if evicted:
+        log(f"  {evicted} conflicting transactions evicted from mempool")
+    if adopted:
+        log(f"  {adopted} orphan transactions accepted into mempool")
+    log(f"  mempool size: {mempool.size()} transactions remaining")
+    log(f"  utxo set hash: {block.utxo_set_hash[:16]}...")
+    log(f"{ '='*60}\n")
+    
+    # blocks are not kept here; whoever needs them (such as an address index) takes them from on_block
+    if on_block is not None:
+        on_block(block)
+    return block
 
 # gets the current block height
 def get_current_block_height() -> int:
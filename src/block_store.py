@@ -0,0 +1,284 @@
+from typing import Iterator, List, Optional, Tuple
+from src.block import Block
+from src.transaction import Transaction, TransactionInput, TransactionOutput
+import mmap
+import os
+import struct
+import zlib
+
+# first bytes of every block file
+FILE_MAGIC = b"UTXOBLK1"
+
+# transaction id of the outputs stored as block 0
+GENESIS_TX_ID = "genesis"
+
+# record framing: payload length and crc32 of the payload
+_RECORD_HEADER = struct.Struct("<II")
+# block payload header: height, timestamp, total fees, transaction count
+_BLOCK_HEADER = struct.Struct("<IqdI")
+# transaction header: flags, input count, output count
+_TX_HEADER = struct.Struct("<BHH")
+# per input after the previous tx id: output index and the amount it spent
+_INPUT_FIXED = struct.Struct("<Id")
+_AMOUNT = struct.Struct("<d")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+
+# transaction flag bits
+_FLAG_REPLACEABLE = 1
+
+# appends a length-prefixed utf-8 string; the prefix is 16 bits, so longer strings are refused
+def _put_string(parts: List[bytes], text: str) -> None:
+    data = text.encode()
+    if len(data) > 0xFFFF:
+        raise ValueError(f"string of {len(data)} bytes is over the 65535-byte record limit")
+    parts.append(_U16.pack(len(data)))
+    parts.append(data)
+
+# returns a zero-copy slice of a length-prefixed string and the offset just past it
+def _string_at(view: memoryview, offset: int) -> Tuple[memoryview, int]:
+    (length,) = _U16.unpack_from(view, offset)
+    start = offset + _U16.size
+    return view[start:start + length], start + length
+
+# serializes a transaction, with the amount each input spent taken from the block's spent utxos
+def _encode_transaction(tx: Transaction, block: Block) -> bytes:
+    parts: List[bytes] = []
+    _put_string(parts, tx.tx_id)
+    if len(tx.inputs) > 0xFFFF or len(tx.outputs) > 0xFFFF:
+        raise ValueError(f"transaction {tx.tx_id} has more than 65535 inputs or outputs")
+    parts.append(_TX_HEADER.pack(_FLAG_REPLACEABLE if tx.replaceable else 0, len(tx.inputs), len(tx.outputs)))
+    for inp in tx.inputs:
+        _put_string(parts, inp.prev_tx_id)
+        amount = block.spent_utxos[(inp.prev_tx_id, inp.output_index)][0]
+        parts.append(_INPUT_FIXED.pack(inp.output_index, amount))
+        _put_string(parts, inp.owner)
+    for out in tx.outputs:
+        parts.append(_AMOUNT.pack(out.amount))
+        _put_string(parts, out.address)
+    return b"".join(parts)
+
+# serializes a block: header, miner, coinbase id, set hash, a table of transaction offsets, transactions
+def encode_block(block: Block) -> bytes:
+    head: List[bytes] = [_BLOCK_HEADER.pack(block.block_height, block.timestamp, block.total_fees, len(block.transactions))]
+    _put_string(head, block.miner)
+    _put_string(head, block.coinbase_tx_id)
+    _put_string(head, block.utxo_set_hash or "")
+    head_size = sum(len(part) for part in head)
+
+    bodies = [_encode_transaction(tx, block) for tx in block.transactions]
+    offset = head_size + _U32.size * len(bodies)
+    table: List[bytes] = []
+    for body in bodies:
+        table.append(_U32.pack(offset))
+        offset += len(body)
+    return b"".join(head + table + bodies)
+
+# builds block 0 from the utxo set's genesis outputs, so a reindex can start from an empty set
+def genesis_block(utxo_manager, timestamp: Optional[int] = None) -> Block:
+    outputs = sorted(
+        (index, data.amount, data.owner)
+        for (tx_id, index), data in utxo_manager.items()
+        if tx_id == GENESIS_TX_ID
+    )
+    if [index for index, _, _ in outputs] != list(range(len(outputs))):
+        raise ValueError("genesis outputs are incomplete (already spent?)")
+
+    genesis = Transaction(GENESIS_TX_ID, [], [TransactionOutput(amount, owner) for _, amount, owner in outputs])
+    block = Block(0, [genesis], GENESIS_TX_ID, 0.0, timestamp=timestamp)
+    block.utxo_set_hash = utxo_manager.get_set_hash()
+    return block
+
+# read-only view of one stored block over the mapped file; fields are decoded only when asked for
+class LazyBlock:
+    # parses the fixed header and the offsets of the variable-length fields
+    def __init__(self, payload: memoryview):
+        self.payload = payload
+        self.block_height, self.timestamp, self.total_fees, self.tx_count = _BLOCK_HEADER.unpack_from(payload, 0)
+        self._miner, offset = _string_at(payload, _BLOCK_HEADER.size)
+        self._coinbase_tx_id, offset = _string_at(payload, offset)
+        self._utxo_set_hash, self._table = _string_at(payload, offset)
+
+    @property
+    def miner(self) -> str:
+        return str(self._miner, "utf-8")
+
+    @property
+    def coinbase_tx_id(self) -> str:
+        return str(self._coinbase_tx_id, "utf-8")
+
+    @property
+    def utxo_set_hash(self) -> Optional[str]:
+        return str(self._utxo_set_hash, "utf-8") or None
+
+    # returns where transaction i starts in the payload
+    def _tx_offset(self, i: int) -> int:
+        if not 0 <= i < self.tx_count:
+            raise IndexError(f"transaction {i} out of range")
+        return _U32.unpack_from(self.payload, self._table + i * _U32.size)[0]
+
+    # returns transaction i's id as a slice of the file, without copying
+    def tx_id_bytes(self, i: int) -> memoryview:
+        return _string_at(self.payload, self._tx_offset(i))[0]
+
+    # returns transaction i's id
+    def tx_id(self, i: int) -> str:
+        return str(self.tx_id_bytes(i), "utf-8")
+
+    # yields (prev tx id, index, amount, owner) for transaction i's inputs, ids and owners as slices
+    def iter_inputs(self, i: int) -> Iterator[Tuple[memoryview, int, float, memoryview]]:
+        _, offset = _string_at(self.payload, self._tx_offset(i))
+        _, input_count, _ = _TX_HEADER.unpack_from(self.payload, offset)
+        offset += _TX_HEADER.size
+        for _ in range(input_count):
+            prev_tx_id, offset = _string_at(self.payload, offset)
+            index, amount = _INPUT_FIXED.unpack_from(self.payload, offset)
+            owner, offset = _string_at(self.payload, offset + _INPUT_FIXED.size)
+            yield prev_tx_id, index, amount, owner
+
+    # yields (amount, address) for transaction i's outputs, addresses as slices
+    def iter_outputs(self, i: int) -> Iterator[Tuple[float, memoryview]]:
+        _, offset = _string_at(self.payload, self._tx_offset(i))
+        _, input_count, output_count = _TX_HEADER.unpack_from(self.payload, offset)
+        offset += _TX_HEADER.size
+        for _ in range(input_count):
+            _, offset = _string_at(self.payload, offset)
+            _, offset = _string_at(self.payload, offset + _INPUT_FIXED.size)
+        for _ in range(output_count):
+            (amount,) = _AMOUNT.unpack_from(self.payload, offset)
+            address, offset = _string_at(self.payload, offset + _AMOUNT.size)
+            yield amount, address
+
+    # yields every outpoint the block spends as (prev tx id slice, index)
+    def iter_spent_outpoints(self) -> Iterator[Tuple[memoryview, int]]:
+        for i in range(self.tx_count):
+            for prev_tx_id, index, _, _ in self.iter_inputs(i):
+                yield prev_tx_id, index
+
+    # builds transaction i as a full object
+    def transaction(self, i: int) -> Transaction:
+        flags, _, _ = _TX_HEADER.unpack_from(self.payload, _string_at(self.payload, self._tx_offset(i))[1])
+        inputs = [
+            TransactionInput(str(prev_tx_id, "utf-8"), index, str(owner, "utf-8"))
+            for prev_tx_id, index, _, owner in self.iter_inputs(i)
+        ]
+        outputs = [TransactionOutput(amount, str(address, "utf-8")) for amount, address in self.iter_outputs(i)]
+        return Transaction(self.tx_id(i), inputs, outputs, bool(flags & _FLAG_REPLACEABLE))
+
+    # builds the full block, with the spent utxo amounts and owners recorded at mining time
+    def to_block(self) -> Block:
+        transactions = [self.transaction(i) for i in range(self.tx_count)]
+        spent_utxos = {}
+        for i in range(self.tx_count):
+            for prev_tx_id, index, amount, owner in self.iter_inputs(i):
+                spent_utxos[(str(prev_tx_id, "utf-8"), index)] = (amount, str(owner, "utf-8"))
+
+        block = Block(self.block_height, transactions, self.miner, self.total_fees, spent_utxos, self.timestamp)
+        block.coinbase_tx_id = self.coinbase_tx_id
+        block.utxo_set_hash = self.utxo_set_hash
+        return block
+
+    def __repr__(self):
+        return f"lazyblock(height={self.block_height}, txs={self.tx_count}, bytes={len(self.payload)})"
+
+# append-only file of checksummed block records, read through a memory map
+class BlockStore:
+    # opens (or creates) a block file, dropping a torn record left by an interrupted append
+    def __init__(self, path: str):
+        self.path = path
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "w+b" if is_new else "r+b")
+        if is_new:
+            self.file.write(FILE_MAGIC)
+            self.file.flush()
+        elif self.file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} is not a block file")
+
+        # (payload offset, payload length, crc32) per stored block, in height order
+        self.records: List[Tuple[int, int, int]] = []
+        self._map: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+        self._scan()
+
+    # indexes record headers without reading payloads, truncating an incomplete or corrupt tail
+    def _scan(self) -> None:
+        size = os.path.getsize(self.path)
+        view = self._mapping()
+        offset = len(FILE_MAGIC)
+        while offset + _RECORD_HEADER.size <= size:
+            length, crc = _RECORD_HEADER.unpack_from(view, offset)
+            start = offset + _RECORD_HEADER.size
+            if start + length > size:
+                break
+            self.records.append((start, length, crc))
+            offset = start + length
+
+        if self.records and not self.verify(len(self.records) - 1):
+            self.records.pop()
+            offset = self.records[-1][0] + self.records[-1][1] if self.records else len(FILE_MAGIC)
+        if offset != size:
+            self._view = None
+            self._map = None
+            self.file.truncate(offset)
+
+    # returns a read-only view of the whole file, remapping after it grew
+    def _mapping(self) -> memoryview:
+        size = os.path.getsize(self.path)
+        if self._view is None or len(self._view) < size:
+            # older maps stay alive for as long as blocks handed out still reference them
+            self._map = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+        return self._view
+
+    # returns the raw payload of block i
+    def payload(self, i: int) -> memoryview:
+        start, length, _ = self.records[i]
+        return self._mapping()[start:start + length]
+
+    # checks block i's checksum
+    def verify(self, i: int) -> bool:
+        return zlib.crc32(self.payload(i)) == self.records[i][2]
+
+    # appends a block, which must be the next height; payload is the block already run through
+    # encode_block, for callers that encode before committing anything the write depends on
+    def append(self, block: Block, payload: Optional[bytes] = None) -> int:
+        if block.block_height != len(self.records):
+            raise ValueError(f"block height {block.block_height} does not follow stored height {len(self.records) - 1}")
+
+        if payload is None:
+            payload = encode_block(block)
+        end = self.file.seek(0, os.SEEK_END)
+        start = end + _RECORD_HEADER.size
+        try:
+            self.file.write(_RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+            self.file.write(payload)
+            self.file.flush()
+        except OSError:
+            # drop whatever part of the record reached the file, so it still ends on a whole block
+            self.file.truncate(end)
+            raise
+        self.records.append((start, len(payload), zlib.crc32(payload)))
+        return len(self.records) - 1
+
+    # returns the height of the last stored block, or -1 if empty
+    def tip_height(self) -> int:
+        return len(self.records) - 1
+
+    # returns a lazy view of block i
+    def __getitem__(self, i: int) -> LazyBlock:
+        return LazyBlock(self.payload(i))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    # yields lazy views of every stored block in height order
+    def __iter__(self) -> Iterator[LazyBlock]:
+        for i in range(len(self.records)):
+            yield self[i]
+
+    # flushes and closes the file (blocks already handed out keep their own reference to the map)
+    def close(self) -> None:
+        self._view = None
+        self._map = None
+        self.file.close()
@@ -0,0 +1,176 @@
+from typing import Dict, List, Optional, Tuple
+from src.transaction import Transaction, SATOSHIS_PER_BTC
+import math
+
+# lowest fee rate tracked, in sat/byte (anything below lands in the first bucket)
+MIN_BUCKET_FEE_RATE = 0.1
+
+# highest fee rate tracked, in sat/byte (anything above lands in the last bucket)
+MAX_BUCKET_FEE_RATE = 1_000_000.0
+
+# ratio between consecutive bucket boundaries
+BUCKET_SPACING = 1.2
+
+# longest confirmation target answered, in blocks
+MAX_TARGET_BLOCKS = 25
+
+# per-block decay applied to historical counts
+DECAY = 0.998
+
+# share of txs in a bucket range that must confirm within the target
+SUCCESS_THRESHOLD = 0.85
+
+# decayed data points a bucket range needs before it is trusted
+SUFFICIENT_TXS = 1.0
+
+# estimates fee rates from how quickly past transactions confirmed
+class FeeEstimator:
+    # initializes empty bucketed statistics
+    def __init__(self):
+        self.buckets: List[float] = []
+        rate = MIN_BUCKET_FEE_RATE
+        while rate < MAX_BUCKET_FEE_RATE:
+            self.buckets.append(rate)
+            rate *= BUCKET_SPACING
+        self.buckets.append(MAX_BUCKET_FEE_RATE)
+        num_buckets = len(self.buckets)
+
+        self.best_height = 0
+        # confirmed[t][b]: decayed txs in bucket b that confirmed within t + 1 blocks
+        self.confirmed = [[0.0] * num_buckets for _ in range(MAX_TARGET_BLOCKS)]
+        self.total_confirmed = [0.0] * num_buckets
+        self.fee_rate_sums = [0.0] * num_buckets
+        # unconfirmed[h % MAX_TARGET_BLOCKS][b]: pending txs that entered at height h
+        self.unconfirmed = [[0] * num_buckets for _ in range(MAX_TARGET_BLOCKS)]
+        self.old_unconfirmed = [0] * num_buckets
+        self.tracked: Dict[str, Tuple[int, int]] = {}
+        self.estimates: List[Optional[float]] = [None] * (MAX_TARGET_BLOCKS + 1)
+
+    # starts an estimator without history at the chain's current height, e.g. after a snapshot is loaded,
+    # so transactions entering now aren't counted as waiting since block 0
+    def start_at(self, height: int) -> None:
+        if self.tracked:
+            raise ValueError("fee estimator already tracks transactions")
+        self.best_height = height
+
+    # returns the bucket index for a fee rate
+    def _bucket_for(self, fee_rate: float) -> int:
+        if fee_rate <= MIN_BUCKET_FEE_RATE:
+            return 0
+        index = math.ceil(math.log(fee_rate / MIN_BUCKET_FEE_RATE, BUCKET_SPACING))
+        return min(index, len(self.buckets) - 1)
+
+    # starts tracking a transaction that just entered the mempool
+    def process_transaction(self, tx: Transaction) -> None:
+        if tx.tx_id in self.tracked:
+            return
+        bucket = self._bucket_for(tx.fee_rate())
+        self.tracked[tx.tx_id] = (self.best_height, bucket)
+        self.unconfirmed[self.best_height % MAX_TARGET_BLOCKS][bucket] += 1
+
+    # stops tracking a transaction that left the mempool without confirming
+    def remove_transaction(self, tx_id: str) -> None:
+        entry = self.tracked.pop(tx_id, None)
+        if entry is not None:
+            self._untrack(*entry)
+
+    # removes a tracked transaction from the pending counts
+    def _untrack(self, entry_height: int, bucket: int) -> None:
+        if self.best_height - entry_height >= MAX_TARGET_BLOCKS:
+            self.old_unconfirmed[bucket] -= 1
+        else:
+            self.unconfirmed[entry_height % MAX_TARGET_BLOCKS][bucket] -= 1
+
+    # records the confirmations in a newly mined block and refreshes all estimates
+    def process_block(self, height: int, transactions: List[Transaction]) -> None:
+        if height <= self.best_height:
+            return
+
+        # rows of txs that are now pending longer than the longest target get folded together
+        first_unfolded = max(self.best_height - MAX_TARGET_BLOCKS + 1, height - 2 * MAX_TARGET_BLOCKS + 1)
+        for old_height in range(first_unfolded, height - MAX_TARGET_BLOCKS + 1):
+            row = self.unconfirmed[old_height % MAX_TARGET_BLOCKS]
+            for b, count in enumerate(row):
+                self.old_unconfirmed[b] += count
+                row[b] = 0
+
+        for row in self.confirmed:
+            for b in range(len(row)):
+                row[b] *= DECAY
+        for b in range(len(self.buckets)):
+            self.total_confirmed[b] *= DECAY
+            self.fee_rate_sums[b] *= DECAY
+
+        self.best_height = height
+
+        for tx in transactions:
+            entry = self.tracked.pop(tx.tx_id, None)
+            if entry is None:
+                continue
+            entry_height, bucket = entry
+            self._untrack(entry_height, bucket)
+
+            blocks_to_confirm = max(1, height - entry_height)
+            for target in range(blocks_to_confirm, MAX_TARGET_BLOCKS + 1):
+                self.confirmed[target - 1][bucket] += 1
+            self.total_confirmed[bucket] += 1
+            self.fee_rate_sums[bucket] += tx.fee_rate()
+
+        self._refresh_estimates()
+
+    # recomputes the answer for every target so queries are a table lookup
+    def _refresh_estimates(self) -> None:
+        num_buckets = len(self.buckets)
+
+        # failed[t][b]: txs still pending after at least t + 1 blocks
+        failed = [[0] * num_buckets for _ in range(MAX_TARGET_BLOCKS)]
+        running = list(self.old_unconfirmed)
+        failed[MAX_TARGET_BLOCKS - 1] = list(running)
+        for age in range(MAX_TARGET_BLOCKS - 1, 0, -1):
+            row = self.unconfirmed[(self.best_height - age) % MAX_TARGET_BLOCKS]
+            for b in range(num_buckets):
+                running[b] += row[b]
+            failed[age - 1] = list(running)
+
+        for target in range(1, MAX_TARGET_BLOCKS + 1):
+            self.estimates[target] = self._estimate_from_stats(
+                self.confirmed[target - 1], failed[target - 1]
+            )
+
+    # walks buckets from the highest fee rate down, returning the cheapest range that still confirms in time
+    def _estimate_from_stats(self, confirmed: List[float], failed: List[int]) -> Optional[float]:
+        best = None
+        group_confirmed = 0.0
+        group_total = 0.0
+        group_rate_sum = 0.0
+        group_count = 0.0
+
+        for b in range(len(self.buckets) - 1, -1, -1):
+            group_confirmed += confirmed[b]
+            group_total += self.total_confirmed[b] + failed[b]
+            group_rate_sum += self.fee_rate_sums[b]
+            group_count += self.total_confirmed[b]
+
+            if group_total < SUFFICIENT_TXS:
+                continue
+            if group_confirmed / group_total < SUCCESS_THRESHOLD:
+                break
+
+            if group_count > 0:
+                best = group_rate_sum / group_count
+            group_confirmed = group_total = group_rate_sum = group_count = 0.0
+
+        return best
+
+    # returns the fee rate in sat/byte needed to confirm within target blocks, or None without data
+    def estimate_fee_rate(self, target_blocks: int) -> Optional[float]:
+        if target_blocks < 1:
+            raise ValueError(f"confirmation target must be at least 1 block, got {target_blocks}")
+        return self.estimates[min(target_blocks, MAX_TARGET_BLOCKS)]
+
+    # returns the fee in btc for a transaction of the given size, or None without data
+    def estimate_fee(self, size_bytes: int, target_blocks: int) -> Optional[float]:
+        fee_rate = self.estimate_fee_rate(target_blocks)
+        if fee_rate is None:
+            return None
+        return fee_rate * size_bytes / SATOSHIS_PER_BTC
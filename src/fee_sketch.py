@@ -0,0 +1,75 @@
+from typing import Dict, Optional
+import math
+
+# default relative error of a reported quantile
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# values at or below this land in the zero bucket
+MIN_TRACKED_VALUE = 1e-9
+
+# streaming quantile sketch with logarithmic buckets, like ddsketch: every reported quantile is within
+# relative_accuracy of a true value, memory depends on the value range rather than the count, and
+# values can be removed again, which a mempool needs when transactions leave
+class QuantileSketch:
+    # initializes an empty sketch
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative accuracy must be between 0 and 1, got {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.reset()
+
+    # forgets every value
+    def reset(self) -> None:
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    # returns the bucket a positive value falls in: values in (gamma^(i-1), gamma^i] share bucket i
+    def _bucket_for(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    # returns the value reported for a bucket, within relative_accuracy of everything in it
+    def _bucket_value(self, index: int) -> float:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    # adds one value
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value <= MIN_TRACKED_VALUE:
+            self.zero_count += 1
+            return
+        index = self._bucket_for(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    # removes one value previously added
+    def remove(self, value: float) -> None:
+        if value <= MIN_TRACKED_VALUE:
+            if self.zero_count == 0:
+                raise KeyError(f"value {value} is not in the sketch")
+            self.zero_count -= 1
+        else:
+            index = self._bucket_for(value)
+            remaining = self.buckets.get(index, 0) - 1
+            if remaining < 0:
+                raise KeyError(f"value {value} is not in the sketch")
+            if remaining:
+                self.buckets[index] = remaining
+            else:
+                del self.buckets[index]
+        self.count -= 1
+
+    # returns the value below which percentile % of values fall, or None if empty
+    def percentile(self, percentile: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(self.count * percentile / 100))
+        if rank <= self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return self._bucket_value(index)
+        return self._bucket_value(max(self.buckets))
@@ -1,11 +1,31 @@
 import sys
+import os
+import argparse
 from pathlib import Path
-sys.path.insert(0, str(Path(__file__).parent.parent))
-from src.utxo_manager import UTXOManager
+# run as a script rather than as part of the package: make the repository root importable
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+from typing import Callable, List, Optional, TYPE_CHECKING
+from src.utxo_manager import UTXOManager, GENESIS_OUTPUTS, setup_genesis_utxos
 from src.mempool import Mempool
-from src.transaction import create_transaction
-from src.block import mine_block, reset_block_height
-from test.testing import run_all_tests
+from src.transaction import create_transaction, DEFAULT_FEE
+from src.fee_estimator import FeeEstimator
+from src.address_index import AddressIndex, index_block_store
+from src import block
+from src.block import reset_block_height, get_current_block_height
+# the batch runner, simulator, block store, metrics, profiler, reindex worker pool and test scenarios
+# are imported by the options that use them
+if TYPE_CHECKING:
+    from src.block_store import BlockStore
+
+# file the mempool is saved to on exit and reloaded from on startup
+MEMPOOL_FILE = "mempool.dat"
+
+# file the utxo set is saved to on exit and bootstrapped from on startup
+UTXO_SNAPSHOT_FILE = "utxo_snapshot.dat"
+
+# number of entries shown per page by the cli views
+VIEW_PAGE_SIZE = 20
 
 # prints the header
 def print_header():
@@ -16,11 +36,8 @@ def print_header():
 # prints genesis block information
 def print_genesis_info(utxo_manager: UTXOManager):
     print("\ninitial utxos (genesis block):")
-    print(f"- alice: 50.0 btc")
-    print(f"- bob: 30.0 btc")
-    print(f"- charlie: 20.0 btc")
-    print(f"- david: 10.0 btc")
-    print(f"- eve: 5.0 btc")
+    for amount, owner in GENESIS_OUTPUTS:
+        print(f"- {owner}: {amount} btc")
 
 # prints the main menu
 def print_menu():
@@ -30,7 +47,9 @@ def print_menu():
     print("3. view mempool")
     print("4. mine block")
     print("5. run test scenarios")
-    print("6. exit")
+    print("6. view address history")
+    print("7. view metrics")
+    print("8. exit")
 
 # creates a transaction interactively
 def create_transaction_interactive(utxo_manager: UTXOManager, mempool: Mempool):
@@ -41,8 +60,9 @@ def create_transaction_interactive(utxo_manager: UTXOManager, mempool: Mempool):
         print("error: sender cannot be empty")
         return
     
-    balance = utxo_manager.get_balance(sender)
-    print(f"available balance: {balance:.1f} btc")
+    # coins already spent by pending transactions are left out, their unconfirmed change counted in
+    balance = sum(amount for _, _, amount in mempool.get_spendable_utxos(sender, utxo_manager))
+    print(f"available balance: {balance:.8f} btc")
     
     if balance <= 0:
         print(f"error: {sender} has no funds")
@@ -63,13 +83,19 @@ def create_transaction_interactive(utxo_manager: UTXOManager, mempool: Mempool):
         print("error: invalid amount")
         return
     
-    if amount + 0.001 > balance:
+    fee = choose_fee(sender, recipient, amount, utxo_manager, mempool)
+    
+    if amount + fee > balance:
         print(f"error: insufficient funds")
         return
     
+    replaceable = input("allow fee bumping (replace-by-fee)? [y/N]: ").strip().lower() == "y"
+    
     try:
         print("\ncreating transaction...")
-        tx = create_transaction(sender, recipient, amount, utxo_manager)
+        tx = create_transaction(
+            sender, recipient, amount, utxo_manager, replaceable=replaceable, fee=fee, mempool=mempool
+        )
         
         print(f"transaction valid! fee: {tx.fee:.3f} btc")
         print(f"transaction id: {tx.tx_id}")
@@ -85,22 +111,68 @@ def create_transaction_interactive(utxo_manager: UTXOManager, mempool: Mempool):
     except ValueError as e:
         print(f"transaction failed: {e}")
 
-# views the utxo set
+# asks for a confirmation target and turns it into a fee using the estimator
+def choose_fee(sender: str, recipient: str, amount: float, utxo_manager: UTXOManager, mempool: Mempool) -> float:
+    target = input("confirmation target in blocks (enter for default fee): ").strip()
+    if not target or mempool.fee_estimator is None:
+        return DEFAULT_FEE
+    
+    try:
+        target_blocks = int(target)
+        draft = create_transaction(sender, recipient, amount, utxo_manager, mempool=mempool)
+        fee = mempool.fee_estimator.estimate_fee(draft.size(), target_blocks)
+    except ValueError as e:
+        print(f"could not estimate fee: {e}, using default fee")
+        return DEFAULT_FEE
+    
+    if fee is None:
+        print(f"not enough confirmation history yet, using default fee")
+        return DEFAULT_FEE
+    
+    print(f"estimated fee for confirmation within {target_blocks} blocks: {fee:.8f} btc")
+    return fee
+
+# reads an optional number, returning None when left empty or invalid
+def read_optional_amount(prompt: str) -> Optional[float]:
+    text = input(prompt).strip()
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        print(f"error: invalid amount {text}, ignoring filter")
+        return None
+
+# asks whether to show another page
+def want_more(cursor: Optional[object]) -> bool:
+    return cursor is not None and input("show more? [y/N]: ").strip().lower() == "y"
+
+# views the utxo set one page at a time, optionally filtered by owner and amount range
 def view_utxo_set(utxo_manager: UTXOManager):
     print("\n" + "-"*60)
     print("current utxo set")
     print("-"*60)
     
-    if not utxo_manager.utxo_set:
+    if utxo_manager.size() == 0:
         print("utxo set is empty")
         return
     
-    for (tx_id, index), data in sorted(utxo_manager.utxo_set.items()):
-        print(f"({tx_id}, {index}) -> {data['amount']:.3f} btc owned by {data['owner']}")
+    print(f"{utxo_manager.size()} utxos")
+    owner = input("filter by owner (enter for all): ").strip() or None
+    min_amount = read_optional_amount("minimum amount (enter for any): ")
+    max_amount = read_optional_amount("maximum amount (enter for any): ")
+    
+    cursor = None
+    while True:
+        page, cursor = utxo_manager.page_utxos(cursor, VIEW_PAGE_SIZE, owner, min_amount, max_amount)
+        for tx_id, index, amount, utxo_owner in page:
+            print(f"({tx_id}, {index}) -> {amount:.3f} btc owned by {utxo_owner}")
+        if not want_more(cursor):
+            break
     
     print(f"\ntotal supply: {utxo_manager.get_total_supply():.3f} btc")
 
-# views the mempool
+# views mempool statistics, the highest-fee transactions, then everything one page at a time
 def view_mempool(mempool: Mempool):
     print("\n" + "-"*60)
     print("mempool")
@@ -111,20 +183,62 @@ def view_mempool(mempool: Mempool):
         return
     
     stats = mempool.get_statistics()
+    usage = mempool.usage()
     print(f"transactions: {stats['size']}")
+    print(f"memory: {usage['bytes']} / {usage['max_bytes']} bytes")
     print(f"total fees: {stats['total_fees']:.8f} btc")
     
     if stats['size'] > 0:
         print(f"average fee: {stats['avg_fee']:.8f} btc")
         print(f"highest fee: {stats['max_fee']:.8f} btc")
         print(f"lowest fee: {stats['min_fee']:.8f} btc")
+        print(f"fee rate p10/p50/p90: {stats['fee_rate_p10']:.2f} / {stats['fee_rate_p50']:.2f} / "
+              f"{stats['fee_rate_p90']:.2f} sat/byte")
     
-    print("\ntransactions (sorted by fee):")
-    for tx in sorted(mempool.transactions, key=lambda t: t.fee, reverse=True):
+    print(f"\ntop {min(5, stats['size'])} transactions by fee:")
+    for tx in mempool.get_top_transactions(5):
         print(f"  {tx.tx_id}: {len(tx.inputs)} in, {len(tx.outputs)} out, fee={tx.fee:.8f} btc")
+    
+    if stats['size'] <= 5 or input("list all transactions? [y/N]: ").strip().lower() != "y":
+        return
+    
+    print("\nall transactions (arrival order):")
+    cursor = None
+    while True:
+        page, cursor = mempool.page_transactions(cursor, VIEW_PAGE_SIZE)
+        for tx in page:
+            print(f"  {tx.tx_id}: {len(tx.inputs)} in, {len(tx.outputs)} out, fee={tx.fee:.8f} btc")
+        if not want_more(cursor):
+            break
 
-# mines a block interactively
-def mine_block_interactive(utxo_manager: UTXOManager, mempool: Mempool):
+# pages through the confirmed history of an address
+def view_address_history(address_index: AddressIndex):
+    print("\n" + "-"*60)
+    address = input("enter address: ").strip()
+    
+    if not address:
+        print("error: address cannot be empty")
+        return
+    
+    total = address_index.count(address)
+    print(f"{address}: {total} history entries (newest first)")
+    
+    cursor = None
+    while True:
+        entries, cursor = address_index.get_history(address, cursor, limit=10)
+        for height, tx_id, direction, amount in entries:
+            print(f"  block #{height}: {direction} {amount:.8f} btc in {tx_id}")
+        
+        if cursor is None or input("show more? [y/N]: ").strip().lower() != "y":
+            break
+
+# mines a block interactively, handing it to on_block for the address history view and recording it in the block file
+def mine_block_interactive(
+    utxo_manager: UTXOManager,
+    mempool: Mempool,
+    on_block: Callable[[block.Block], None],
+    store: Optional["BlockStore"] = None
+):
     print("\n" + "-"*60)
     miner = input("enter miner name: ").strip()
     
@@ -133,27 +247,310 @@ def mine_block_interactive(utxo_manager: UTXOManager, mempool: Mempool):
         return
     
     print("\nMining block...")
-    block = mine_block(miner, mempool, utxo_manager, num_txs=5)
+    # called through the module so enabled metrics see it
+    try:
+        mined = block.mine_block(
+            miner, mempool, utxo_manager, num_txs=5, on_block=on_block, block_store=store
+        )
+    except (OSError, ValueError) as e:
+        print(f"error: block not recorded: {e}")
+        return
     
-    if not block:
+    if not mined:
         print("mining failed - no transactions available")
 
-# sets up genesis utxos
-def setup_genesis_utxos(utxo_manager: UTXOManager):
-    utxo_manager.add_utxo("genesis", 0, 50.0, "alice")
-    utxo_manager.add_utxo("genesis", 1, 30.0, "bob")
-    utxo_manager.add_utxo("genesis", 2, 20.0, "charlie")
-    utxo_manager.add_utxo("genesis", 3, 10.0, "david")
-    utxo_manager.add_utxo("genesis", 4, 5.0, "eve")
+# bootstraps the utxo set from a previous run's snapshot, returning False if there is none
+def load_utxo_snapshot(utxo_manager: UTXOManager) -> bool:
+    if not os.path.exists(UTXO_SNAPSHOT_FILE):
+        return False
+    
+    try:
+        height = utxo_manager.load_snapshot_file(UTXO_SNAPSHOT_FILE)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"\nwarning: could not load utxo snapshot from {UTXO_SNAPSHOT_FILE}: {e}")
+        return False
+    
+    reset_block_height(height)
+    print(f"\nloaded {utxo_manager.size()} utxos at block height {height} from {UTXO_SNAPSHOT_FILE}")
+    print(f"utxo set hash: {utxo_manager.get_set_hash()}")
+    return True
+
+# saves the utxo set so the next run can bootstrap from it
+def save_utxo_snapshot(utxo_manager: UTXOManager):
+    try:
+        count = utxo_manager.dump_snapshot(UTXO_SNAPSHOT_FILE, get_current_block_height())
+        print(f"saved {count} utxos to {UTXO_SNAPSHOT_FILE}")
+    except OSError as e:
+        print(f"warning: could not save utxo snapshot to {UTXO_SNAPSHOT_FILE}: {e}")
 
-# main function to run the simulator
-def main():
+# reloads the mempool saved by a previous run
+def load_mempool(utxo_manager: UTXOManager, mempool: Mempool):
+    if not os.path.exists(MEMPOOL_FILE):
+        return
+    
+    try:
+        loaded, dropped = mempool.load(MEMPOOL_FILE, utxo_manager)
+        print(f"\nrestored {loaded} transactions from {MEMPOOL_FILE} ({dropped} no longer valid)")
+    except (OSError, ValueError, KeyError) as e:
+        print(f"\nwarning: could not restore mempool from {MEMPOOL_FILE}: {e}")
+
+# saves the mempool so the next run can restore it
+def save_mempool(utxo_manager: UTXOManager, mempool: Mempool):
+    try:
+        count = mempool.dump(MEMPOOL_FILE, utxo_manager)
+        print(f"saved {count} mempool transactions to {MEMPOOL_FILE}")
+    except OSError as e:
+        print(f"warning: could not save mempool to {MEMPOOL_FILE}: {e}")
+
+# prints the metrics report and optionally exports it as json
+def view_metrics():
+    from src import metrics
+    
+    print("\n" + "-"*60)
+    print(metrics.REGISTRY.format_report())
+    
+    path = input("\nexport to json file (enter to skip): ").strip()
+    if path:
+        try:
+            metrics.REGISTRY.export_json(path)
+            print(f"metrics written to {path}")
+        except OSError as e:
+            print(f"error: could not write {path}: {e}")
+
+# adds the options that instrument a run: metrics and profiling
+def _add_run_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--no-metrics", action="store_true",
+                        help="leave entry points uninstrumented (zero overhead)")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="profile mining and mempool admission, writing call stats and allocation snapshots to DIR")
+
+# adds the options of modes that mine blocks
+def _add_chain_options(parser: argparse.ArgumentParser, wallet: bool = True) -> None:
+    if wallet:
+        parser.add_argument("--no-chains", action="store_true",
+                            help="only spend confirmed outputs, hiding unconfirmed change from the wallet view")
+    parser.add_argument("--blocks", metavar="FILE",
+                        help="append every mined block to a block file (a new file starts with genesis as block 0)")
+
+# adds the batch replay options
+def _add_batch_options(parser: argparse.ArgumentParser) -> None:
+    # batch.PACE_MAX and batch.PACE_RECORDED, spelled out so parsing options doesn't load the batch runner
+    parser.add_argument("--pace", choices=["max", "recorded"], default="max",
+                        help="replay as fast as possible or at the workload's recorded timestamps")
+
+# adds the reindex options
+def _add_reindex_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--workers", type=int,
+                        help="worker processes for the reindex (default: one per spare cpu, 0 for none)")
+
+# adds the simulation options
+def _add_simulation_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed for the simulation")
+    # left unset unless given, so the simulator's own defaults apply
+    parser.add_argument("--wallets", type=int,
+                        help="number of wallets in the simulated network (default 100)")
+    parser.add_argument("--tx-rate", type=float,
+                        help="mean simulated transactions per second (default 0.25)")
+    parser.add_argument("--block-interval", type=float,
+                        help="mean simulated seconds between blocks (default 600)")
+
+# parses `python src/main.py` options, where the mode is chosen with --batch, --simulate or --reindex
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="bitcoin transaction simulator")
+    _add_run_options(parser)
+    _add_chain_options(parser)
+    parser.add_argument("--batch", metavar="FILE",
+                        help="replay a json lines workload from genesis instead of showing the menu")
+    _add_batch_options(parser)
+    parser.add_argument("--reindex", metavar="FILE",
+                        help="rebuild the utxo set from a block file and save it as the utxo snapshot")
+    _add_reindex_options(parser)
+    parser.add_argument("--simulate", metavar="DAYS", type=float,
+                        help="run a seeded network simulation for DAYS of simulated time and print its report")
+    _add_simulation_options(parser)
+    return parser.parse_args(argv)
+
+# parses the options of one `python -m src` command; each command only accepts its own, and the
+# options it has no use for are filled with their defaults so main() reads one kind of namespace
+def parse_command_args(command: str, argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog=f"python -m src {command}")
+    parser.set_defaults(no_chains=False, blocks=None, batch=None, pace="max", reindex=None, workers=None,
+                        simulate=None, seed=0, wallets=None, tx_rate=None, block_interval=None)
+    if command == "interactive":
+        parser.description = "run the menu on the saved state"
+        _add_chain_options(parser)
+    elif command == "batch":
+        parser.description = "replay a json lines workload from genesis"
+        parser.add_argument("batch", metavar="FILE", help="json lines workload to replay")
+        _add_chain_options(parser)
+        _add_batch_options(parser)
+    elif command == "simulate":
+        parser.description = "run a seeded network simulation and print its report"
+        parser.add_argument("simulate", metavar="DAYS", type=float, help="days of simulated time")
+        _add_chain_options(parser, wallet=False)
+        _add_simulation_options(parser)
+    elif command == "reindex":
+        parser.description = "rebuild the utxo set from a block file and save it as the utxo snapshot"
+        parser.add_argument("reindex", metavar="FILE", help="block file to rebuild from")
+        _add_reindex_options(parser)
+    else:
+        raise ValueError(f"unknown command {command}")
+    _add_run_options(parser)
+    return parser.parse_args(argv)
+
+# returns the store mined blocks should be recorded in, writing genesis into a new one; None if its tip
+# doesn't match the current height
+def attach_block_store(store: Optional["BlockStore"], utxo_manager: UTXOManager) -> Optional["BlockStore"]:
+    if store is None:
+        return None
+    from src.block_store import genesis_block
+    
+    height = get_current_block_height()
+    if len(store) == 0 and height == 0:
+        store.append(genesis_block(utxo_manager))
+    if store.tip_height() != height:
+        print(f"warning: block file ends at height {store.tip_height()} but the chain is at {height}, not recording blocks")
+        return None
+    return store
+
+# replays a workload file from genesis and prints the summary, without touching saved state
+def run_batch_mode(path: str, pace: str, utxo_manager: UTXOManager, mempool: Mempool, store: Optional["BlockStore"] = None):
+    from src import batch, metrics
+    
+    setup_genesis_utxos(utxo_manager)
+    store = attach_block_store(store, utxo_manager)
+    
+    try:
+        summary = batch.run_batch(path, utxo_manager, mempool, pace, store)
+    except (OSError, ValueError) as e:
+        print(f"error: batch run failed: {e}")
+        sys.exit(1)
+    
+    print(batch.format_summary(summary))
+    if metrics.is_enabled():
+        print(metrics.REGISTRY.format_report())
+
+# runs a network simulation and prints its report, without touching saved state
+def run_simulation_mode(args: argparse.Namespace, store: Optional["BlockStore"] = None):
+    from src import metrics, simulation
+    
+    options = {"wallets": args.wallets, "tx_rate": args.tx_rate, "block_interval": args.block_interval}
+    try:
+        summary = simulation.run_simulation(
+            days=args.simulate,
+            seed=args.seed,
+            block_store=store,
+            **{name: value for name, value in options.items() if value is not None}
+        )
+    except ValueError as e:
+        print(f"error: simulation failed: {e}")
+        sys.exit(1)
+    
+    print(simulation.format_report(summary))
+    if metrics.is_enabled():
+        print(metrics.REGISTRY.format_report())
+
+# rebuilds the utxo set from a block file and saves it where the menu will load it from
+def run_reindex_mode(path: str, workers: Optional[int]):
+    from src import reindex
+    
+    try:
+        # the menu builds address history from the block file itself, so only the utxo set is kept
+        summary = reindex.reindex(path, workers=workers, index_addresses=False)
+    except (OSError, ValueError) as e:
+        print(f"error: reindex failed: {e}")
+        sys.exit(1)
+    
+    utxo_manager = summary["utxo_manager"]
+    reset_block_height(summary["tip_height"])
+    print(f"reindexed {summary['blocks']} blocks in {summary['elapsed_seconds']:.2f} s "
+          f"({summary['blocks_per_second']:.0f} blocks/s, {summary['workers']} workers)")
+    print(f"utxo set: {summary['utxo_set_size']} utxos at height {summary['tip_height']}, hash {summary['utxo_set_hash']}")
+    save_utxo_snapshot(utxo_manager)
+
+# main function to run the simulator; command names a `python -m src` command whose own parser reads argv
+def main(argv: Optional[List[str]] = None, command: Optional[str] = None):
+    args = parse_args(argv) if command is None else parse_command_args(command, argv or [])
     utxo_manager = UTXOManager()
-    mempool = Mempool()
+    mempool = Mempool(fee_estimator=FeeEstimator(), allow_chains=not args.no_chains)
+    
+    if not args.no_metrics:
+        from src import metrics
+        metrics.enable()
+        metrics.register_gauges(utxo_manager, mempool)
+    
+    store = None
+    if args.blocks:
+        from src.block_store import BlockStore
+        try:
+            store = BlockStore(args.blocks)
+        except (OSError, ValueError) as e:
+            print(f"error: could not open block file: {e}")
+            sys.exit(1)
     
+    profiler = None
+    if args.profile:
+        from src.profiling import ProfilingSession
+        profiler = ProfilingSession(args.profile)
+        profiler.start()
+    
+    try:
+        if args.reindex:
+            run_reindex_mode(args.reindex, args.workers)
+        elif args.simulate is not None:
+            run_simulation_mode(args, store)
+        elif args.batch:
+            run_batch_mode(args.batch, args.pace, utxo_manager, mempool, store)
+        else:
+            run_interactive(utxo_manager, mempool, store)
+    finally:
+        if profiler is not None:
+            print(profiler.stop())
+        if store is not None:
+            store.close()
+
+# runs the menu on the saved state (or genesis), saving it again on exit
+def run_interactive(utxo_manager: UTXOManager, mempool: Mempool, store: Optional["BlockStore"] = None):
     print_header()
-    setup_genesis_utxos(utxo_manager)
-    print_genesis_info(utxo_manager)
+    if not load_utxo_snapshot(utxo_manager):
+        setup_genesis_utxos(utxo_manager)
+        print_genesis_info(utxo_manager)
+    if mempool.fee_estimator is not None:
+        mempool.fee_estimator.start_at(get_current_block_height())
+    load_mempool(utxo_manager, mempool)
+    store = attach_block_store(store, utxo_manager)
+    
+    try:
+        run_menu(utxo_manager, mempool, store)
+    finally:
+        save_utxo_snapshot(utxo_manager)
+        save_mempool(utxo_manager, mempool)
+
+# runs the test scenarios from the menu; they reset the global block height and switch metrics off,
+# so both are put back afterwards and the snapshot saved on exit still matches the live utxo set
+def run_test_scenarios():
+    from src import metrics
+    from test.testing import run_all_tests
+    
+    height = get_current_block_height()
+    metrics_enabled = metrics.is_enabled()
+    try:
+        run_all_tests()
+    finally:
+        reset_block_height(height)
+        if metrics_enabled:
+            metrics.enable()
+
+# runs the interactive menu loop; mined blocks go to store, test runs never touch it
+def run_menu(utxo_manager: UTXOManager, mempool: Mempool, store: Optional["BlockStore"] = None):
+    # address history is read from the block file on first use and kept current as blocks are mined;
+    # without a block file it covers the blocks mined in this session
+    address_index: Optional[AddressIndex] = None if store is not None else AddressIndex()
+    
+    def connect_block(mined: block.Block):
+        if address_index is not None:
+            address_index.connect_block(mined)
     
     while True:
         print_menu()
@@ -166,14 +563,20 @@ def main():
         elif choice == "3":
             view_mempool(mempool)
         elif choice == "4":
-            mine_block_interactive(utxo_manager, mempool)
+            mine_block_interactive(utxo_manager, mempool, connect_block, store)
         elif choice == "5":
-            run_all_tests()
+            run_test_scenarios()
         elif choice == "6":
+            if address_index is None:
+                address_index = index_block_store(store)
+            view_address_history(address_index)
+        elif choice == "7":
+            view_metrics()
+        elif choice == "8":
             print("\nExiting simulator...")
             break
         else:
-            print("Invalid choice. please enter 1-6.")
+            print("Invalid choice. please enter 1-8.")
 
 
 if __name__ == "__main__":
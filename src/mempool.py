@@ -1,58 +1,542 @@
-import sys
-from pathlib import Path
-sys.path.insert(0, str(Path(__file__).parent.parent))
-from typing import List, Set, Tuple, Optional
-from src.transaction import Transaction
+from typing import Callable, List, Set, Tuple, Optional, Dict, Iterator
+from src.transaction import Transaction, SATOSHIS_PER_BTC
+from src.fee_sketch import QuantileSketch
+from src.pagination import paginate_by_key, DEFAULT_PAGE_SIZE
+from src.address_registry import REGISTRY
+import heapq
+import json
+import os
+import time
+
+# version tag written at the top of mempool dump files
+MEMPOOL_DUMP_VERSION = 1
+
+# default memory budget for pending transactions
+DEFAULT_MAX_BYTES = 5_000_000
+
+# default age after which pending transactions are dropped (two weeks)
+DEFAULT_EXPIRY_SECONDS = 14 * 24 * 60 * 60
+
+# bookkeeping bytes per transaction (tx_by_id, entry_times and heap entries)
+ENTRY_OVERHEAD_BYTES = 200
+
+# bookkeeping bytes per input (spent_utxos entry and its key tuple)
+INPUT_OVERHEAD_BYTES = 120
+
+# most transactions a single replacement may evict (conflicts plus descendants)
+MAX_REPLACEMENT_EVICTIONS = 100
+
+# fee-rate percentiles reported by get_statistics
+STATISTICS_PERCENTILES = (10, 50, 90)
+
+# default number of transactions held while waiting for a missing parent
+DEFAULT_MAX_ORPHANS = 100
+
+# number of recently mined transaction ids remembered, so spends of their spent outputs aren't orphaned
+MAX_RECENTLY_MINED = 10_000
+
+# read view of the confirmed utxo set plus the outputs of pending mempool transactions
+class MempoolView:
+    # initializes a view over a utxo manager and a mempool
+    def __init__(self, utxo_manager, mempool: "Mempool"):
+        self.utxo_manager = utxo_manager
+        self.mempool = mempool
+
+    # returns the mempool output for an outpoint, or None
+    def _pending_output(self, tx_id: str, index: int):
+        parent = self.mempool.tx_by_id.get(tx_id)
+        if parent is None or not 0 <= index < len(parent.outputs):
+            return None
+        return parent.outputs[index]
+
+    # checks if an outpoint is confirmed or created by a pending transaction
+    def exists(self, tx_id: str, index: int) -> bool:
+        return self.utxo_manager.exists(tx_id, index) or self._pending_output(tx_id, index) is not None
+
+    # gets the amount of a confirmed or pending output
+    def get_utxo_amount(self, tx_id: str, index: int) -> float:
+        output = self._pending_output(tx_id, index)
+        if output is None:
+            return self.utxo_manager.get_utxo_amount(tx_id, index)
+        return output.amount
+
+    # gets the address id of a confirmed or pending output's owner
+    def get_utxo_owner_id(self, tx_id: str, index: int) -> int:
+        output = self._pending_output(tx_id, index)
+        if output is None:
+            return self.utxo_manager.get_utxo_owner_id(tx_id, index)
+        return output.address_id
+
+    # gets the owner of a confirmed or pending output
+    def get_utxo_owner(self, tx_id: str, index: int) -> str:
+        output = self._pending_output(tx_id, index)
+        if output is None:
+            return self.utxo_manager.get_utxo_owner(tx_id, index)
+        return output.address
 
 # stores unconfirmed transactions
 class Mempool:
     # initializes the mempool
-    def __init__(self, max_size: int = 50):
-        self.transactions: List[Transaction] = []
-        self.spent_utxos: Set[Tuple[str, int]] = set()
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        expiry_seconds: Optional[float] = DEFAULT_EXPIRY_SECONDS,
+        fee_estimator=None,
+        allow_chains: bool = False,
+        max_orphans: int = DEFAULT_MAX_ORPHANS,
+        clock: Callable[[], float] = time.time
+    ):
+        self.spent_utxos: Dict[Tuple[str, int], str] = {}
+        # unconfirmed outputs of pending transactions by owner address id, with their amounts
+        self.pending_outputs: Dict[int, Dict[Tuple[str, int], float]] = {}
+        # optional cap on the transaction count; memory is bounded by max_bytes either way
         self.max_size = max_size
-        self.tx_by_id = {}
+        self.max_bytes = max_bytes
+        self.expiry_seconds = expiry_seconds
+        self.tx_by_id: Dict[str, Transaction] = {}
+        self.entry_times: Dict[str, float] = {}
+        self.entry_bytes: Dict[str, int] = {}
+        # (fee in satoshis, fee rate) each transaction was admitted with; a revalidation can rewrite tx.fee,
+        # so the running aggregates are undone with these rather than the transaction's current fee
+        self.entry_fees: Dict[str, Tuple[int, float]] = {}
+        self.total_bytes = 0
+        self._fee_rate_heap: List[Tuple[float, int, str]] = []
+        self._heap_seq: Dict[str, int] = {}
+        self._next_seq = 0
+        # running aggregates for get_statistics: total fee in satoshis, lazy min/max fee heaps
+        # (stale entries skipped like the fee-rate heap) and a fee-rate sketch
+        self._total_fee_sats = 0
+        self._min_fee_heap: List[Tuple[int, int, str]] = []
+        self._max_fee_heap: List[Tuple[int, int, str]] = []
+        self.fee_rate_sketch = QuantileSketch()
+        self.fee_estimator = fee_estimator
+        # source of admission and expiry times, replaceable by a simulated clock
+        self.clock = clock
+        # accept transactions spending outputs of other pending transactions
+        self.allow_chains = allow_chains
+        self.max_orphans = max_orphans
+        # orphans in arrival order, and the orphans waiting on each missing outpoint (dicts as ordered sets)
+        self.orphans: Dict[str, Transaction] = {}
+        self.orphans_by_outpoint: Dict[Tuple[str, int], Dict[str, None]] = {}
+        self._orphan_missing: Dict[str, List[Tuple[str, int]]] = {}
+        # when each orphan first arrived; orphans expire after expiry_seconds like pending transactions
+        self.orphan_times: Dict[str, float] = {}
+        # heap of (arrival time, orphan id) for expiry; entries whose time no longer matches orphan_times are stale
+        self._orphan_expiry: List[Tuple[float, str]] = []
+        # ids of recently mined transactions, oldest first (a dict as an ordered set)
+        self.recently_mined: Dict[str, None] = {}
 
-    # validates and adds transaction to mempool
+    # returns pending transactions in admission order
+    @property
+    def transactions(self) -> List[Transaction]:
+        return list(self.tx_by_id.values())
+
+    # validates and adds transaction to mempool, then retries orphans that were waiting for it
     def add_transaction(self, tx: Transaction, utxo_manager) -> Tuple[bool, str]:
+        success, msg = self._accept(tx, utxo_manager)
+        if success and self.allow_chains:
+            self.retry_orphans(self._output_utxos(tx), utxo_manager)
+        return success, msg
+
+    # returns what transactions are validated against: the utxo set, plus pending outputs if chains are allowed
+    def _utxo_view(self, utxo_manager):
+        return MempoolView(utxo_manager, self) if self.allow_chains else utxo_manager
+
+    # checks whether a transaction is known to have been confirmed or, with chains, to be pending, so a
+    # missing output of it was spent or never existed rather than not yet seen
+    def _parent_known(self, tx_id: str, utxo_manager) -> bool:
+        return (tx_id in self.recently_mined or (self.allow_chains and tx_id in self.tx_by_id)
+                or utxo_manager.has_unspent_outputs(tx_id))
+
+    # validates and adds one transaction, holding it as an orphan if a parent output is missing
+    def _accept(self, tx: Transaction, utxo_manager) -> Tuple[bool, str]:
         if tx.tx_id in self.tx_by_id:
             return False, "transaction already in mempool"
-        
-        if len(self.transactions) >= self.max_size:
-            lowest_fee_tx = min(self.transactions, key=lambda t: t.fee)
-            
-            if tx.fee <= lowest_fee_tx.fee:
-                return False, f"mempool full and transaction fee too low (need > {lowest_fee_tx.fee:.8f} btc)"
-            
-            self._remove_transaction(lowest_fee_tx.tx_id)
-            print(f"evicted transaction {lowest_fee_tx.tx_id} (fee: {lowest_fee_tx.fee:.8f} btc)")
-
-        is_valid, error_msg = tx.is_valid(utxo_manager, self.spent_utxos)
+        if tx.tx_id in self.orphans:
+            return False, "transaction already in orphan pool"
+
+        self.expire()
+
+        view = self._utxo_view(utxo_manager)
+        missing = [utxo for utxo in self._input_utxos(tx) if not view.exists(*utxo)]
+        if missing:
+            spent = next((utxo for utxo in missing if self._parent_known(utxo[0], utxo_manager)), None)
+            if spent is not None:
+                return False, f"utxo {spent} already spent or never created by known transaction {spent[0]}"
+            self._add_orphan(tx, missing)
+            return False, f"transaction {tx.tx_id} held as orphan: {len(missing)} parent outputs not found"
+
+        conflicts = self._direct_conflicts(tx)
+        for conflict_id in conflicts:
+            if not self.tx_by_id[conflict_id].replaceable:
+                utxo = next(u for u in self._input_utxos(tx) if self.spent_utxos.get(u) == conflict_id)
+                return False, f"utxo {utxo} already spent in mempool by {conflict_id} (first-seen rule)"
+
+        # every mempool spend of tx's inputs belongs to a conflict that is about to be replaced
+        mempool_spent = {} if conflicts else self.spent_utxos
+        is_valid, error_msg = tx.is_valid(view, mempool_spent)
         if not is_valid:
             return False, f"invalid transaction: {error_msg}"
 
-        for tx_input in tx.inputs:
-            utxo = (tx_input.prev_tx_id, tx_input.output_index)
-            if utxo in self.spent_utxos:
-                conflicting_tx_id = None
-                for existing_tx in self.transactions:
-                    for existing_input in existing_tx.inputs:
-                        if (existing_input.prev_tx_id, existing_input.output_index) == utxo:
-                            conflicting_tx_id = existing_tx.tx_id
-                            break
-                    if conflicting_tx_id:
-                        break
-                
-                return False, f"utxo {utxo} already spent in mempool by {conflicting_tx_id} (first-seen rule)"
-
-        self.transactions.append(tx)
+        replaced: List[str] = []
+        if conflicts:
+            replaced, error_msg = self._check_replacement(tx, conflicts)
+            if error_msg:
+                return False, f"replacement rejected: {error_msg}"
+
+        to_evict = self._select_evictions(tx, replaced, self._ancestors(tx))
+        if to_evict is None:
+            return False, f"mempool full and transaction fee rate too low ({tx.fee_rate():.2f} sat/byte)"
+
+        for replaced_id in replaced:
+            self._remove_transaction(replaced_id)
+
+        for evicted_id in to_evict:
+            evicted = self.tx_by_id.get(evicted_id)
+            if evicted is None:
+                continue
+            self._remove_with_descendants(evicted_id)
+            print(f"evicted transaction {evicted_id} (fee: {evicted.fee:.8f} btc, {evicted.fee_rate():.2f} sat/byte)")
+
+        self._insert(tx, self.clock())
+
+        if replaced:
+            return True, f"transaction {tx.tx_id} replaced {len(replaced)} mempool transactions (fee: {tx.fee:.8f} btc)"
+        return True, f"transaction {tx.tx_id} added to mempool (fee: {tx.fee:.8f} btc)"
+
+    # returns the outpoints a transaction spends
+    @staticmethod
+    def _input_utxos(tx: Transaction) -> List[Tuple[str, int]]:
+        return [(tx_input.prev_tx_id, tx_input.output_index) for tx_input in tx.inputs]
+
+    # returns the outpoints a transaction creates
+    @staticmethod
+    def _output_utxos(tx: Transaction) -> List[Tuple[str, int]]:
+        return [(tx.tx_id, index) for index in range(len(tx.outputs))]
+
+    # returns ids of in-mempool transactions tx depends on, directly or indirectly
+    def _ancestors(self, tx: Transaction) -> Set[str]:
+        ancestors = set()
+        pending = [tx]
+        while pending:
+            for tx_input in pending.pop().inputs:
+                parent = self.tx_by_id.get(tx_input.prev_tx_id)
+                if parent is not None and parent.tx_id not in ancestors:
+                    ancestors.add(parent.tx_id)
+                    pending.append(parent)
+        return ancestors
+
+    # removes a transaction and every in-mempool transaction spending its outputs
+    def _remove_with_descendants(self, tx_id: str) -> None:
+        for removed_id in self._with_descendants({tx_id}, len(self.tx_by_id)):
+            self._remove_transaction(removed_id)
+
+    # holds a transaction until its missing outpoints appear, dropping the oldest orphan when full
+    def _add_orphan(self, tx: Transaction, missing: List[Tuple[str, int]]) -> None:
+        if self.max_orphans <= 0:
+            return
+        while len(self.orphans) >= self.max_orphans:
+            self._remove_orphan(next(iter(self.orphans)))
+
+        self.orphans[tx.tx_id] = tx
+        self._set_orphan_time(tx.tx_id, self.clock())
+        self._orphan_missing[tx.tx_id] = missing
+        for utxo in missing:
+            self.orphans_by_outpoint.setdefault(utxo, {})[tx.tx_id] = None
+
+    # forgets an orphan and its outpoint index entries, returning it
+    def _remove_orphan(self, tx_id: str) -> Optional[Transaction]:
+        tx = self.orphans.pop(tx_id, None)
+        if tx is None:
+            return None
+        del self.orphan_times[tx_id]
+        for utxo in self._orphan_missing.pop(tx_id):
+            waiting = self.orphans_by_outpoint.get(utxo)
+            if waiting is not None:
+                waiting.pop(tx_id, None)
+                if not waiting:
+                    del self.orphans_by_outpoint[utxo]
+        if len(self._orphan_expiry) > 2 * len(self.orphans) + 64:
+            self._orphan_expiry = [entry for entry in self._orphan_expiry if self.orphan_times.get(entry[1]) == entry[0]]
+            heapq.heapify(self._orphan_expiry)
+        return tx
+
+    # records when an orphan arrived and schedules its expiry
+    def _set_orphan_time(self, tx_id: str, entry_time: float) -> None:
+        self.orphan_times[tx_id] = entry_time
+        heapq.heappush(self._orphan_expiry, (entry_time, tx_id))
+
+    # retries exactly the orphans waiting on the given outpoints (and, with chains, on outputs of
+    # orphans accepted along the way); returns how many were accepted
+    def retry_orphans(self, outpoints: List[Tuple[str, int]], utxo_manager) -> int:
+        accepted = 0
+        pending = list(outpoints)
+        while pending:
+            waiting = self.orphans_by_outpoint.get(pending.pop())
+            if not waiting:
+                continue
+            for orphan_id in list(waiting):
+                entry_time = self.orphan_times.get(orphan_id)
+                orphan = self._remove_orphan(orphan_id)
+                if orphan is None:
+                    continue
+                success, _ = self._accept(orphan, utxo_manager)
+                # an orphan still missing other parents keeps its original age
+                if orphan_id in self.orphan_times:
+                    self._set_orphan_time(orphan_id, entry_time)
+                if success:
+                    accepted += 1
+                    if self.allow_chains:
+                        pending.extend(self._output_utxos(orphan))
+        return accepted
+
+    # clears a mined block out of the pool: drops its transactions, evicts entries double-spending its inputs
+    # (with their descendants) and retries orphans waiting on its outputs, all in time proportional to the
+    # block; surviving entries stay as they are. returns (conflicts evicted, orphans accepted)
+    def remove_for_block(self, block, utxo_manager) -> Tuple[int, int]:
+        for tx in block.transactions:
+            self._remove_transaction(tx.tx_id)
+            self._remember_mined(tx.tx_id)
+        self._remember_mined(block.coinbase_tx_id)
+
+        evicted = 0
+        for utxo in block.spent_utxos:
+            conflict = self.spent_utxos.get(utxo)
+            if conflict is not None:
+                before = len(self.tx_by_id)
+                self._remove_with_descendants(conflict)
+                evicted += before - len(self.tx_by_id)
+
+        outputs = [(tx.tx_id, index) for tx in block.transactions for index in range(len(tx.outputs))]
+        outputs.append((block.coinbase_tx_id, 0))
+        return evicted, self.retry_orphans(outputs, utxo_manager)
+
+    # picks up to n transactions for a block, parents first; with chains each pick brings its missing
+    # in-mempool ancestors along (skipped if the package doesn't fit), so no child is mined without its parent
+    def select_for_block(self, n: int) -> List[Transaction]:
+        if not self.allow_chains:
+            return self.get_top_transactions(n)
+
+        chosen: Dict[str, Transaction] = {}
+        # candidates come off a heap highest fee first (earliest admitted on ties), so only the ones the
+        # block reaches are ever ordered
+        candidates = [(-tx.fee, self._heap_seq[tx.tx_id], tx) for tx in self.tx_by_id.values()]
+        heapq.heapify(candidates)
+        while candidates and len(chosen) < n:
+            tx = heapq.heappop(candidates)[2]
+            if tx.tx_id in chosen:
+                continue
+            package = [ancestor for ancestor in self._ancestors(tx) if ancestor not in chosen]
+            if len(chosen) + len(package) + 1 > n:
+                continue
+            for ancestor in package:
+                chosen[ancestor] = self.tx_by_id[ancestor]
+            chosen[tx.tx_id] = tx
+        return self.order_for_block(list(chosen.values()))
+
+    # orders transactions so that parents in the list come before their children, otherwise keeping order
+    def order_for_block(self, txs: List[Transaction]) -> List[Transaction]:
+        selected = {tx.tx_id: tx for tx in txs}
+        ordered: List[Transaction] = []
+        placed: Set[str] = set()
+
+        # iterative depth-first walk, so long unconfirmed chains can't exhaust the stack
+        for tx in txs:
+            stack = [(tx, False)]
+            while stack:
+                current, parents_placed = stack.pop()
+                if current.tx_id in placed:
+                    continue
+                if parents_placed:
+                    placed.add(current.tx_id)
+                    ordered.append(current)
+                    continue
+                stack.append((current, True))
+                for tx_input in reversed(current.inputs):
+                    parent = selected.get(tx_input.prev_tx_id)
+                    if parent is not None and parent.tx_id not in placed:
+                        stack.append((parent, False))
+        return ordered
+
+    # returns ids of mempool transactions spending any of tx's inputs
+    def _direct_conflicts(self, tx: Transaction) -> Set[str]:
+        conflicts = set()
+        for utxo in self._input_utxos(tx):
+            spender = self.spent_utxos.get(utxo)
+            if spender is not None:
+                conflicts.add(spender)
+        return conflicts
+
+    # collects the given transactions plus all their in-mempool descendants, stopping past limit
+    def _with_descendants(self, tx_ids: Set[str], limit: int) -> List[str]:
+        found = list(tx_ids)
+        seen = set(tx_ids)
+        i = 0
+        while i < len(found) and len(found) <= limit:
+            parent = self.tx_by_id[found[i]]
+            for index in range(len(parent.outputs)):
+                child = self.spent_utxos.get((parent.tx_id, index))
+                if child is not None and child not in seen:
+                    seen.add(child)
+                    found.append(child)
+            i += 1
+        return found
+
+    # applies replace-by-fee rules, returning the ids to replace or an error message
+    def _check_replacement(self, tx: Transaction, conflicts: Set[str]) -> Tuple[List[str], str]:
+        replaced = self._with_descendants(conflicts, MAX_REPLACEMENT_EVICTIONS)
+        if len(replaced) > MAX_REPLACEMENT_EVICTIONS:
+            return [], f"would evict more than {MAX_REPLACEMENT_EVICTIONS} transactions"
+
+        replaced_ids = set(replaced)
+        if any(tx_input.prev_tx_id in replaced_ids for tx_input in tx.inputs):
+            return [], "transaction spends an output of a transaction it replaces"
+
+        replaced_fees = sum(self.tx_by_id[tx_id].fee for tx_id in replaced)
+        if tx.fee <= replaced_fees:
+            return [], f"fee {tx.fee:.8f} btc must exceed replaced fees {replaced_fees:.8f} btc"
+
+        conflict_rate = max(self.tx_by_id[tx_id].fee_rate() for tx_id in conflicts)
+        if tx.fee_rate() <= conflict_rate:
+            return [], f"fee rate {tx.fee_rate():.2f} sat/byte must exceed {conflict_rate:.2f} sat/byte"
+
+        return replaced, ""
+
+    # returns the tracked footprint of a transaction including mempool bookkeeping
+    def _entry_bytes(self, tx: Transaction) -> int:
+        return tx.size() + ENTRY_OVERHEAD_BYTES + INPUT_OVERHEAD_BYTES * len(tx.inputs)
+
+    # checks whether one more entry of the given size fits within the byte budget (and count cap, if set)
+    def _has_room(self, entry_bytes: int, count: int = 0, freed_bytes: int = 0) -> bool:
+        return ((self.max_size is None or len(self.tx_by_id) - count < self.max_size)
+                and self.total_bytes - freed_bytes + entry_bytes <= self.max_bytes)
+
+    # picks the lowest fee-rate transactions to evict so tx fits, or None if tx doesn't outbid them
+    def _select_evictions(
+        self,
+        tx: Transaction,
+        replaced: List[str] = (),
+        protected: Set[str] = frozenset()
+    ) -> Optional[List[str]]:
+        entry_bytes = self._entry_bytes(tx)
+        if entry_bytes > self.max_bytes:
+            return None
+
+        tx_rate = tx.fee_rate()
+        popped = []
+        to_evict = []
+        freed_count = len(replaced)
+        freed_bytes = sum(self.entry_bytes[tx_id] for tx_id in replaced)
+        replaced_ids = set(replaced)
+
+        while not self._has_room(entry_bytes, freed_count, freed_bytes):
+            entry = self._pop_lowest_fee_rate()
+            if entry is None or entry[0] >= tx_rate:
+                if entry is not None:
+                    popped.append(entry)
+                to_evict = None
+                break
+            popped.append(entry)
+            # replaced ones are already counted, and tx's own ancestors must stay
+            if entry[2] in replaced_ids or entry[2] in protected:
+                continue
+            to_evict.append(entry[2])
+            freed_count += 1
+            freed_bytes += self.entry_bytes[entry[2]]
+
+        # nothing is removed yet, evicted entries get dropped from the heap by _remove_transaction
+        for entry in popped:
+            heapq.heappush(self._fee_rate_heap, entry)
+        return to_evict
+
+    # returns a heap of the entries of a heap that still belong to pending transactions
+    def _live_entries(self, heap: List[Tuple]) -> List[Tuple]:
+        live = [entry for entry in heap if self._heap_seq.get(entry[2]) == entry[1]]
+        heapq.heapify(live)
+        return live
+
+    # returns the top live entry of a heap, dropping stale ones above it
+    def _peek_live(self, heap: List[Tuple]) -> Optional[Tuple]:
+        while heap:
+            entry = heap[0]
+            if self._heap_seq.get(entry[2]) == entry[1]:
+                return entry
+            heapq.heappop(heap)
+        return None
+
+    # pops the live heap entry with the lowest fee rate, skipping stale ones
+    def _pop_lowest_fee_rate(self) -> Optional[Tuple[float, int, str]]:
+        while self._fee_rate_heap:
+            entry = heapq.heappop(self._fee_rate_heap)
+            if self._heap_seq.get(entry[2]) == entry[1]:
+                return entry
+        return None
+
+    # records a mined transaction id, forgetting the oldest past MAX_RECENTLY_MINED
+    def _remember_mined(self, tx_id: str) -> None:
+        self.recently_mined[tx_id] = None
+        if len(self.recently_mined) > MAX_RECENTLY_MINED:
+            del self.recently_mined[next(iter(self.recently_mined))]
+
+    # removes transactions that have been pending longer than expiry_seconds, and orphans that have
+    # waited that long for their parents; returns the number of pending transactions removed
+    def expire(self, now: Optional[float] = None) -> int:
+        if self.expiry_seconds is None:
+            return 0
+        
+        cutoff = (self.clock() if now is None else now) - self.expiry_seconds
+        # orphans come off their expiry heap oldest first, stopping at the first one still young enough
+        while self._orphan_expiry and self._orphan_expiry[0][0] <= cutoff:
+            entry_time, tx_id = heapq.heappop(self._orphan_expiry)
+            if self.orphan_times.get(tx_id) == entry_time:
+                self._remove_orphan(tx_id)
+
+        expired = []
+        for tx_id, entry_time in self.entry_times.items():
+            if entry_time > cutoff:
+                break
+            expired.append(tx_id)
+        
+        removed = 0
+        for tx_id in expired:
+            if tx_id in self.tx_by_id:
+                before = len(self.tx_by_id)
+                self._remove_with_descendants(tx_id)
+                removed += before - len(self.tx_by_id)
+        return removed
+
+    # internally stores an already validated transaction
+    def _insert(self, tx: Transaction, entry_time: float) -> None:
         self.tx_by_id[tx.tx_id] = tx
+        self.entry_times[tx.tx_id] = entry_time
+
+        entry_bytes = self._entry_bytes(tx)
+        self.entry_bytes[tx.tx_id] = entry_bytes
+        self.total_bytes += entry_bytes
+
+        fee_sats = round(tx.fee * SATOSHIS_PER_BTC)
+        fee_rate = tx.fee_rate()
+        self.entry_fees[tx.tx_id] = (fee_sats, fee_rate)
+
+        self._next_seq += 1
+        self._heap_seq[tx.tx_id] = self._next_seq
+        heapq.heappush(self._fee_rate_heap, (fee_rate, self._next_seq, tx.tx_id))
+
+        self._total_fee_sats += fee_sats
+        heapq.heappush(self._min_fee_heap, (fee_sats, self._next_seq, tx.tx_id))
+        heapq.heappush(self._max_fee_heap, (-fee_sats, self._next_seq, tx.tx_id))
+        self.fee_rate_sketch.add(fee_rate)
 
         for tx_input in tx.inputs:
             utxo = (tx_input.prev_tx_id, tx_input.output_index)
-            self.spent_utxos.add(utxo)
+            self.spent_utxos[utxo] = tx.tx_id
 
-        return True, f"transaction {tx.tx_id} added to mempool (fee: {tx.fee:.8f} btc)"
+        for index, output in enumerate(tx.outputs):
+            self.pending_outputs.setdefault(output.address_id, {})[(tx.tx_id, index)] = output.amount
+
+        if self.fee_estimator is not None:
+            self.fee_estimator.process_transaction(tx)
 
     # internally removes a transaction
     def _remove_transaction(self, tx_id: str) -> bool:
@@ -63,10 +547,32 @@ class Mempool:
         
         for tx_input in tx.inputs:
             utxo = (tx_input.prev_tx_id, tx_input.output_index)
-            self.spent_utxos.discard(utxo)
+            self.spent_utxos.pop(utxo, None)
+        
+        for index, output in enumerate(tx.outputs):
+            owned = self.pending_outputs.get(output.address_id)
+            if owned is not None:
+                owned.pop((tx_id, index), None)
+                if not owned:
+                    del self.pending_outputs[output.address_id]
         
-        self.transactions.remove(tx)
         del self.tx_by_id[tx_id]
+        del self.entry_times[tx_id]
+        del self._heap_seq[tx_id]
+        self.total_bytes -= self.entry_bytes.pop(tx_id)
+        fee_sats, fee_rate = self.entry_fees.pop(tx_id)
+        self._total_fee_sats -= fee_sats
+        self.fee_rate_sketch.remove(fee_rate)
+
+        if self.fee_estimator is not None:
+            self.fee_estimator.remove_transaction(tx_id)
+
+        # rebuild the heaps once stale entries dominate them
+        if len(self._fee_rate_heap) > 2 * len(self.tx_by_id) + 64:
+            self._fee_rate_heap = self._live_entries(self._fee_rate_heap)
+        if len(self._min_fee_heap) > 2 * len(self.tx_by_id) + 64:
+            self._min_fee_heap = self._live_entries(self._min_fee_heap)
+            self._max_fee_heap = self._live_entries(self._max_fee_heap)
         
         return True
 
@@ -74,10 +580,49 @@ class Mempool:
     def remove_transaction(self, tx_id: str) -> bool:
         return self._remove_transaction(tx_id)
 
-    # returns top n transactions by fee
+    # returns top n transactions by fee, using a bounded heap instead of sorting the whole pool
     def get_top_transactions(self, n: int) -> List[Transaction]:
-        sorted_txs = sorted(self.transactions, key=lambda tx: tx.fee, reverse=True)
-        return sorted_txs[:n]
+        return heapq.nlargest(n, self.tx_by_id.values(), key=lambda tx: tx.fee)
+
+    # lazily yields transactions matching the filters, in arrival order
+    def iter_transactions(
+        self,
+        owner: Optional[str] = None,
+        min_fee: Optional[float] = None,
+        max_fee: Optional[float] = None
+    ) -> Iterator[Transaction]:
+        owner_id = None
+        if owner is not None:
+            owner_id = REGISTRY.lookup(owner)
+            if owner_id is None:
+                return
+
+        for tx in self.tx_by_id.values():
+            if min_fee is not None and tx.fee < min_fee:
+                continue
+            if max_fee is not None and tx.fee > max_fee:
+                continue
+            if owner_id is not None and not (
+                any(inp.owner_id == owner_id for inp in tx.inputs)
+                or any(out.address_id == owner_id for out in tx.outputs)
+            ):
+                continue
+            yield tx
+
+    # returns one page of matching transactions in admission order plus the admission sequence of the
+    # page's last one as the next page's cursor (None on the last page); transactions mined or evicted
+    # between pages don't shift the ones not yet read
+    def page_transactions(
+        self,
+        cursor: Optional[int] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        owner: Optional[str] = None,
+        min_fee: Optional[float] = None,
+        max_fee: Optional[float] = None
+    ) -> Tuple[List[Transaction], Optional[int]]:
+        return paginate_by_key(
+            self.iter_transactions(owner, min_fee, max_fee), lambda tx: self._heap_seq[tx.tx_id], cursor, limit
+        )
 
     # gets a specific transaction by id
     def get_transaction(self, tx_id: str) -> Optional[Transaction]:
@@ -85,13 +630,141 @@ class Mempool:
 
     # returns number of transactions in mempool
     def size(self) -> int:
-        return len(self.transactions)
+        return len(self.tx_by_id)
+
+    # returns current memory usage against the configured limits
+    def usage(self) -> dict:
+        return {
+            "transactions": len(self.tx_by_id),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_size": self.max_size,
+            "expiry_seconds": self.expiry_seconds,
+            "orphans": len(self.orphans),
+            "max_orphans": self.max_orphans
+        }
 
     # clears all transactions from mempool
     def clear(self) -> None:
-        self.transactions.clear()
         self.spent_utxos.clear()
+        self.pending_outputs.clear()
         self.tx_by_id.clear()
+        self.entry_times.clear()
+        self.entry_bytes.clear()
+        self.entry_fees.clear()
+        self.total_bytes = 0
+        self._fee_rate_heap.clear()
+        self._heap_seq.clear()
+        self._total_fee_sats = 0
+        self._min_fee_heap.clear()
+        self._max_fee_heap.clear()
+        self.fee_rate_sketch.reset()
+        self.orphans.clear()
+        self.orphans_by_outpoint.clear()
+        self._orphan_missing.clear()
+        self.orphan_times.clear()
+        self._orphan_expiry.clear()
+        self.recently_mined.clear()
+
+    # writes the mempool to a file, one compact json record per line
+    def dump(self, path: str, utxo_manager) -> int:
+        # write next to the target and rename, so a crash mid-dump never leaves a partial file behind
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps({"version": MEMPOOL_DUMP_VERSION, "count": len(self.tx_by_id)}) + "\n")
+            for tx in sorted(self.tx_by_id.values(), key=lambda t: self.entry_times[t.tx_id]):
+                coins = [
+                    [utxo_manager.get_utxo_amount(inp.prev_tx_id, inp.output_index),
+                     utxo_manager.get_utxo_owner(inp.prev_tx_id, inp.output_index)]
+                    if utxo_manager.exists(inp.prev_tx_id, inp.output_index) else None
+                    for inp in tx.inputs
+                ]
+                record = {
+                    "tx": tx.to_dict(),
+                    "time": self.entry_times[tx.tx_id],
+                    "fee": tx.fee,
+                    "coins": coins
+                }
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, path)
+        return len(self.tx_by_id)
+
+    # reloads a mempool dump, only revalidating transactions whose inputs changed since the dump
+    def load(self, path: str, utxo_manager) -> Tuple[int, int]:
+        loaded = 0
+        dropped = 0
+
+        with open(path) as f:
+            header = json.loads(f.readline())
+            if header.get("version") != MEMPOOL_DUMP_VERSION:
+                raise ValueError(f"unsupported mempool dump version: {header.get('version')}")
+
+            # read every record before applying any, so a truncated file changes nothing
+            records = [json.loads(line) for line in f]
+        if len(records) != header.get("count"):
+            raise ValueError(f"mempool dump truncated: expected {header.get('count')} transactions, found {len(records)}")
+
+        for record in records:
+            tx = Transaction.from_dict(record["tx"])
+
+            if self._coins_unchanged(tx, record["coins"], utxo_manager):
+                # the fee follows from the dumped coins; a stored fee that disagrees means the record was edited
+                fee = sum(amount for amount, _ in record["coins"]) - sum(out.amount for out in tx.outputs)
+                stored_fee = record.get("fee")
+                if fee < 0 or (stored_fee is not None and
+                               round(stored_fee * SATOSHIS_PER_BTC) != round(fee * SATOSHIS_PER_BTC)):
+                    dropped += 1
+                    continue
+                tx.fee = fee
+                if self._has_room(self._entry_bytes(tx)):
+                    tx.is_validated = True
+                    self._insert(tx, record["time"])
+                    loaded += 1
+                    continue
+
+            success, _ = self.add_transaction(tx, utxo_manager)
+            if success:
+                self.entry_times[tx.tx_id] = record["time"]
+                loaded += 1
+            else:
+                dropped += 1
+
+        expired = self.expire()
+        return loaded - expired, dropped + expired
+
+    # checks that a dumped transaction's inputs are still unspent with the same amount and owner
+    def _coins_unchanged(self, tx: Transaction, coins: list, utxo_manager) -> bool:
+        if tx.tx_id in self.tx_by_id or len(coins) != len(tx.inputs):
+            return False
+
+        seen = set()
+        for inp, coin in zip(tx.inputs, coins):
+            utxo = (inp.prev_tx_id, inp.output_index)
+            if coin is None or utxo in seen or utxo in self.spent_utxos or not utxo_manager.exists(*utxo):
+                return False
+            seen.add(utxo)
+
+            amount, owner = coin
+            if utxo_manager.get_utxo_amount(*utxo) != amount or utxo_manager.get_utxo_owner(*utxo) != owner:
+                return False
+            if owner != inp.owner:
+                return False
+        return True
+
+    # returns (tx_id, index, amount) for an owner's coins not yet spent by a pending transaction, plus their
+    # unconfirmed outputs when chains are allowed; a wallet view built from indexes, not a mempool scan
+    def get_spendable_utxos(self, owner: str, utxo_manager) -> List[Tuple[str, int, float]]:
+        spendable = [
+            (tx_id, index, amount)
+            for tx_id, index, amount in utxo_manager.get_utxos_for_owner(owner)
+            if (tx_id, index) not in self.spent_utxos
+        ]
+        owner_id = REGISTRY.lookup(owner)
+        if self.allow_chains and owner_id is not None:
+            for utxo, amount in self.pending_outputs.get(owner_id, {}).items():
+                if utxo not in self.spent_utxos:
+                    spendable.append((utxo[0], utxo[1], amount))
+        return spendable
 
     # checks if a utxo is spent in the mempool
     def is_utxo_spent(self, tx_id: str, index: int) -> bool:
@@ -99,34 +772,37 @@ class Mempool:
 
     # returns human-readable mempool view
     def __str__(self) -> str:
-        if not self.transactions:
+        if not self.tx_by_id:
             return "mempool is empty."
         
-        lines = [f"mempool ({len(self.transactions)} transactions):"]
-        for tx in sorted(self.transactions, key=lambda t: t.fee, reverse=True):
+        top = self.get_top_transactions(DEFAULT_PAGE_SIZE)
+        lines = [f"mempool ({len(self.tx_by_id)} transactions):"]
+        for tx in top:
             lines.append(f"  {tx.tx_id}: {len(tx.inputs)} inputs -> {len(tx.outputs)} outputs, fee={tx.fee:.8f} btc")
+        if len(top) < len(self.tx_by_id):
+            lines.append(f"  ... and {len(self.tx_by_id) - len(top)} more")
         return "\n".join(lines)
     
     # calculates total fees in mempool
     def get_total_fees(self) -> float:
-        return sum(tx.fee for tx in self.transactions)
+        return self._total_fee_sats / SATOSHIS_PER_BTC
     
-    # gets mempool statistics
+    # gets mempool statistics from running aggregates, without touching every transaction;
+    # fee_rate_pN are sketch estimates (within 1%) in sat/byte
     def get_statistics(self) -> dict:
-        if not self.transactions:
-            return {
-                "size": 0,
-                "total_fees": 0.0,
-                "avg_fee": 0.0,
-                "max_fee": 0.0,
-                "min_fee": 0.0
-            }
-        
-        fees = [tx.fee for tx in self.transactions]
-        return {
-            "size": len(self.transactions),
-            "total_fees": sum(fees),
-            "avg_fee": sum(fees) / len(fees),
-            "max_fee": max(fees),
-            "min_fee": min(fees)
+        size = len(self.tx_by_id)
+        total_fees = self.get_total_fees()
+        stats = {
+            "size": size,
+            "total_fees": total_fees,
+            "avg_fee": total_fees / size if size else 0.0,
+            "max_fee": 0.0,
+            "min_fee": 0.0,
+            "bytes": self.total_bytes
         }
+        if size:
+            stats["max_fee"] = -self._peek_live(self._max_fee_heap)[0] / SATOSHIS_PER_BTC
+            stats["min_fee"] = self._peek_live(self._min_fee_heap)[0] / SATOSHIS_PER_BTC
+        for p in STATISTICS_PERCENTILES:
+            stats[f"fee_rate_p{p}"] = self.fee_rate_sketch.percentile(p) if size else 0.0
+        return stats
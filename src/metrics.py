@@ -0,0 +1,239 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from src import block, transaction
+from src.mempool import Mempool
+from src.utxo_manager import UTXOManager
+import functools
+import json
+import math
+import time
+
+# sub-buckets per power of two in a latency histogram (relative error at most 1/16)
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+# percentiles reported for every histogram
+REPORTED_PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+# latency histogram with log-linear buckets over integer nanoseconds, like an hdr histogram
+class Histogram:
+    # initializes an empty histogram
+    def __init__(self):
+        self.reset()
+
+    # forgets every recorded value
+    def reset(self) -> None:
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    # returns the bucket index for a value: exact below SUB_BUCKETS, then SUB_BUCKETS per power of two
+    @staticmethod
+    def _bucket_for(value: int) -> int:
+        if value < SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+    # returns the highest value that lands in a bucket
+    @staticmethod
+    def _bucket_upper(index: int) -> int:
+        if index < SUB_BUCKETS:
+            return index
+        shift = index // SUB_BUCKETS - 1
+        low = (index % SUB_BUCKETS + SUB_BUCKETS) << shift
+        return low + (1 << shift) - 1
+
+    # records one value in nanoseconds
+    def record(self, value: int) -> None:
+        index = self._bucket_for(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    # returns the value below which percentile % of recordings fall, or None if empty
+    def percentile(self, percentile: float) -> Optional[int]:
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(self.count * percentile / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._bucket_upper(index), self.max)
+        return self.max
+
+    # returns count, mean, min, max and percentiles in microseconds
+    def summary(self) -> dict:
+        if self.count == 0:
+            return {"count": 0}
+        result = {
+            "count": self.count,
+            "mean_us": self.total / self.count / 1000,
+            "min_us": self.min / 1000,
+            "max_us": self.max / 1000
+        }
+        for p in REPORTED_PERCENTILES:
+            result[f"p{p:g}_us"] = self.percentile(p) / 1000
+        return result
+
+# named counters, gauges and latency histograms
+class MetricsRegistry:
+    # initializes an empty registry
+    def __init__(self):
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, Callable[[], float]] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    # adds to a counter
+    def inc(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    # registers a gauge, read only when the registry is dumped
+    def set_gauge(self, name: str, read: Callable[[], float]) -> None:
+        self.gauges[name] = read
+
+    # returns the histogram with a name, creating it on first use
+    def histogram(self, name: str) -> Histogram:
+        if name not in self.histograms:
+            self.histograms[name] = Histogram()
+        return self.histograms[name]
+
+    # forgets all counters and recordings (gauges and histograms stay registered)
+    def reset(self) -> None:
+        self.counters.clear()
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+    # returns every metric as plain data
+    def snapshot(self) -> dict:
+        return {
+            "enabled": is_enabled(),
+            "counters": dict(sorted(self.counters.items())),
+            "gauges": {name: read() for name, read in sorted(self.gauges.items())},
+            "histograms": {name: h.summary() for name, h in sorted(self.histograms.items())}
+        }
+
+    # writes the snapshot to a json file
+    def export_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    # returns a human-readable report
+    def format_report(self) -> str:
+        data = self.snapshot()
+        lines = [f"metrics ({'enabled' if data['enabled'] else 'disabled'}):"]
+
+        lines.append("counters:")
+        for name, value in data["counters"].items():
+            lines.append(f"  {name}: {value}")
+
+        lines.append("gauges:")
+        for name, value in data["gauges"].items():
+            lines.append(f"  {name}: {value}")
+
+        lines.append("latency (us):")
+        for name, summary in data["histograms"].items():
+            if summary["count"] == 0:
+                continue
+            lines.append(
+                f"  {name}: n={summary['count']} mean={summary['mean_us']:.1f} "
+                f"p50={summary['p50_us']:.1f} p90={summary['p90_us']:.1f} "
+                f"p99={summary['p99_us']:.1f} max={summary['max_us']:.1f}"
+            )
+        return "\n".join(lines)
+
+# process-wide registry
+REGISTRY = MetricsRegistry()
+
+# (owner, attribute, original) for every entry point replaced while metrics are enabled
+_ORIGINALS: List[Tuple[object, str, Callable]] = []
+
+# wraps a function so each call is timed into a histogram, passing the result and arguments to on_result
+def _timed(name: str, func: Callable, on_result: Optional[Callable[[object, tuple], None]] = None) -> Callable:
+    histogram = REGISTRY.histogram(name)
+    clock = time.perf_counter_ns
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            histogram.record(clock() - start)
+        if on_result is not None:
+            on_result(result, args)
+        return result
+
+    return wrapper
+
+# counts mempool admissions by outcome
+def _count_admission(result: Tuple[bool, str], args: tuple) -> None:
+    REGISTRY.inc("mempool.accepted" if result[0] else "mempool.rejected")
+
+# counts mined blocks and the transactions they confirmed
+def _count_block(mined: Optional[block.Block], args: tuple) -> None:
+    if mined is None:
+        REGISTRY.inc("block.failed")
+    else:
+        REGISTRY.inc("block.mined")
+        REGISTRY.inc("block.transactions", len(mined.transactions))
+
+# counts utxos added to the set
+def _count_utxo_add(result: None, args: tuple) -> None:
+    REGISTRY.inc("utxo.added")
+
+# counts utxos removed from the set
+def _count_utxo_remove(result: None, args: tuple) -> None:
+    REGISTRY.inc("utxo.removed")
+
+# counts utxos removed and added by a successful apply_block(self, spends, creates)
+def _count_block_apply(failures: list, args: tuple) -> None:
+    if failures:
+        REGISTRY.inc("utxo.apply_failed")
+    else:
+        REGISTRY.inc("utxo.removed", len(args[1]))
+        REGISTRY.inc("utxo.added", len(args[2]))
+
+# registers gauges that are read whenever metrics are dumped
+def register_gauges(utxo_manager: UTXOManager, mempool: Mempool) -> None:
+    REGISTRY.set_gauge("mempool.transactions", mempool.size)
+    REGISTRY.set_gauge("mempool.bytes", lambda: mempool.total_bytes)
+    REGISTRY.set_gauge("mempool.total_fees", mempool.get_total_fees)
+    REGISTRY.set_gauge("mempool.fee_rate_p50", lambda: mempool.get_statistics()["fee_rate_p50"])
+    REGISTRY.set_gauge("utxo.set_size", utxo_manager.size)
+    REGISTRY.set_gauge("block.height", block.get_current_block_height)
+
+# returns whether the entry points are currently instrumented
+def is_enabled() -> bool:
+    return bool(_ORIGINALS)
+
+# instruments the entry points; callers must go through the module or class attribute to be measured
+def enable() -> None:
+    if _ORIGINALS:
+        return
+
+    targets = [
+        (transaction, "validate_transaction", "validate_transaction", None),
+        (Mempool, "add_transaction", "mempool.add_transaction", _count_admission),
+        (Mempool, "get_top_transactions", "mempool.get_top_transactions", None),
+        (UTXOManager, "add_utxo", "utxo.add_utxo", _count_utxo_add),
+        (UTXOManager, "remove_utxo", "utxo.remove_utxo", _count_utxo_remove),
+        (UTXOManager, "apply_block", "utxo.apply_block", _count_block_apply),
+        (block, "mine_block", "mine_block", _count_block)
+    ]
+    for owner, attribute, name, on_result in targets:
+        original = getattr(owner, attribute)
+        _ORIGINALS.append((owner, attribute, original))
+        setattr(owner, attribute, _timed(name, original, on_result))
+
+# restores the original entry points, so disabled metrics cost nothing
+def disable() -> None:
+    while _ORIGINALS:
+        owner, attribute, original = _ORIGINALS.pop()
+        setattr(owner, attribute, original)
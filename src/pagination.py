@@ -0,0 +1,27 @@
+from typing import Callable, Iterable, List, Optional, Tuple, TypeVar
+import heapq
+
+# entries per page when the caller doesn't choose
+DEFAULT_PAGE_SIZE = 50
+
+T = TypeVar("T")
+K = TypeVar("K")
+
+# returns the page of items whose keys sort first after the cursor, plus the last key of the page as
+# the next page's cursor. entries added or removed between pages don't shift the ones not yet read,
+# and only limit + 1 items are kept, so the collection is never sorted as a whole
+def paginate_by_key(
+    items: Iterable[T],
+    key: Callable[[T], K],
+    cursor: Optional[K] = None,
+    limit: int = DEFAULT_PAGE_SIZE
+) -> Tuple[List[T], Optional[K]]:
+    if limit < 1:
+        raise ValueError(f"page limit must be at least 1, got {limit}")
+    if cursor is not None:
+        items = (item for item in items if key(item) > cursor)
+    # read one entry past the page to learn whether another page follows
+    page = heapq.nsmallest(limit + 1, items, key=key)
+    if len(page) > limit:
+        return page[:limit], key(page[limit - 1])
+    return page, None
@@ -0,0 +1,129 @@
+from typing import Callable, List, Tuple
+from src import block, transaction
+from src.mempool import Mempool
+from src.utxo_manager import UTXOManager
+import cProfile
+import functools
+import inspect
+import linecache
+import os
+import pstats
+import tracemalloc
+
+# frames kept per traced allocation
+TRACEMALLOC_FRAMES = 1
+
+# functions listed in the text call-stats report
+PROFILE_REPORT_LINES = 30
+
+# files written into the output directory
+PROFILE_STATS_FILE = "profile.pstats"
+PROFILE_TEXT_FILE = "profile.txt"
+SNAPSHOT_START_FILE = "tracemalloc_start.snap"
+SNAPSHOT_END_FILE = "tracemalloc_end.snap"
+ALLOCATIONS_FILE = "allocations.txt"
+
+# returns (component, source file, first line, last line) for the code whose allocations are reported
+def _component_ranges() -> List[Tuple[str, str, int, int]]:
+    ranges = []
+    for name, obj in (
+        ("UTXOManager", UTXOManager),
+        ("Mempool", Mempool),
+        ("validate_transaction", inspect.unwrap(transaction.validate_transaction))
+    ):
+        lines, first = inspect.getsourcelines(obj)
+        ranges.append((name, os.path.abspath(inspect.getsourcefile(obj)), first, first + len(lines) - 1))
+    return ranges
+
+# profiles mining and mempool admission: cprofile runs only inside those calls, tracemalloc for the session
+class ProfilingSession:
+    # initializes a session that writes its files into output_dir
+    def __init__(self, output_dir: str, top: int = 10):
+        self.output_dir = output_dir
+        self.top = top
+        self.profile = cProfile.Profile()
+        self.depth = 0
+        self.start_snapshot = None
+        self.originals: List[Tuple[object, str, Callable]] = []
+
+    # wraps a function so the profiler is switched on for the duration of each outermost call
+    def _profiled(self, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self.depth += 1
+            if self.depth == 1:
+                self.profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.profile.disable()
+
+        return wrapper
+
+    # starts tracing allocations and instruments mine_block and Mempool.add_transaction
+    def start(self) -> None:
+        if self.originals:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.start_snapshot = tracemalloc.take_snapshot()
+
+        for owner, attribute in ((block, "mine_block"), (Mempool, "add_transaction")):
+            original = getattr(owner, attribute)
+            self.originals.append((owner, attribute, original))
+            setattr(owner, attribute, self._profiled(original))
+
+    # restores the entry points, writes stats and snapshots, and returns the allocation report
+    def stop(self) -> str:
+        if not self.originals:
+            return ""
+        while self.originals:
+            owner, attribute, original = self.originals.pop()
+            setattr(owner, attribute, original)
+
+        end_snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        self.profile.dump_stats(os.path.join(self.output_dir, PROFILE_STATS_FILE))
+        with open(os.path.join(self.output_dir, PROFILE_TEXT_FILE), "w") as f:
+            stats = pstats.Stats(self.profile, stream=f)
+            stats.sort_stats("cumulative").print_stats(PROFILE_REPORT_LINES)
+
+        self.start_snapshot.dump(os.path.join(self.output_dir, SNAPSHOT_START_FILE))
+        end_snapshot.dump(os.path.join(self.output_dir, SNAPSHOT_END_FILE))
+
+        report = self.allocation_report(end_snapshot)
+        with open(os.path.join(self.output_dir, ALLOCATIONS_FILE), "w") as f:
+            f.write(report + "\n")
+        return report
+
+    # lists the top allocating lines of UTXOManager, Mempool and validate_transaction since start
+    def allocation_report(self, end_snapshot: tracemalloc.Snapshot) -> str:
+        ranges = _component_ranges()
+        filters = [tracemalloc.Filter(True, filename) for filename in {r[1] for r in ranges}]
+        diffs = end_snapshot.filter_traces(filters).compare_to(
+            self.start_snapshot.filter_traces(filters), "lineno"
+        )
+
+        lines = [f"top allocating sites (profile data in {self.output_dir}):"]
+        for name, filename, first, last in ranges:
+            sites = [
+                diff for diff in diffs
+                if diff.size_diff > 0
+                and os.path.abspath(diff.traceback[0].filename) == filename
+                and first <= diff.traceback[0].lineno <= last
+            ]
+            sites.sort(key=lambda diff: diff.size_diff, reverse=True)
+
+            lines.append(f"{name}: {sum(diff.size_diff for diff in sites) / 1024:.1f} KiB")
+            for diff in sites[:self.top]:
+                frame = diff.traceback[0]
+                source = linecache.getline(frame.filename, frame.lineno).strip()
+                lines.append(
+                    f"  {diff.size_diff / 1024:8.1f} KiB {diff.count_diff:7d} blocks  "
+                    f"{os.path.basename(frame.filename)}:{frame.lineno}  {source}"
+                )
+        return "\n".join(lines)
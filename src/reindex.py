@@ -0,0 +1,174 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from src.address_index import AddressIndex
+from src.block_store import BlockStore, LazyBlock
+from src.utxo_manager import UTXOManager, utxo_hash_element, SET_HASH_MODULUS
+import mmap
+import multiprocessing
+import os
+import time
+import zlib
+
+# blocks handed to a worker per task
+DEFAULT_CHUNK_SIZE = 8
+
+# seconds between progress reports
+PROGRESS_INTERVAL = 1.0
+
+# read-only map of the block file, opened once per worker process
+_WORKER_MAP: Optional[mmap.mmap] = None
+
+# maps the block file in a worker process
+def _open_worker_map(path: str) -> None:
+    global _WORKER_MAP
+    with open(path, "rb") as f:
+        _WORKER_MAP = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+# unmaps the block file after an in-process run
+def _close_worker_map() -> None:
+    global _WORKER_MAP
+    if _WORKER_MAP is not None:
+        try:
+            _WORKER_MAP.close()
+        except BufferError:
+            # a failed parse's traceback still holds slices; the map closes once they are collected
+            pass
+        _WORKER_MAP = None
+
+# checks, parses and hashes one stored block (height, offset, length, crc, index addresses) into plain
+# data the applying process can use directly: spends, creates, set hash delta and address index entries
+def _parse_block(task: Tuple[int, int, int, int, bool]) -> dict:
+    height, start, length, crc, index_addresses = task
+    payload = memoryview(_WORKER_MAP)[start:start + length]
+    if zlib.crc32(payload) != crc:
+        raise ValueError(f"block {height}: checksum mismatch")
+
+    block = LazyBlock(payload)
+    if block.block_height != height:
+        raise ValueError(f"block {height}: record claims height {block.block_height}")
+
+    spends: List[Tuple[str, int]] = []
+    # outputs created so far in this block; one spent later in the block never reaches the set
+    creates: Dict[Tuple[str, int], Tuple[float, str]] = {}
+    entries: List[Tuple[str, List[Tuple[str, float]], List[Tuple[str, float]]]] = []
+    delta = 0
+    for i in range(block.tx_count):
+        tx_id = block.tx_id(i)
+        inputs = []
+        for prev_tx_id, index, amount, owner in block.iter_inputs(i):
+            prev_tx_id, owner = str(prev_tx_id, "utf-8"), str(owner, "utf-8")
+            if creates.pop((prev_tx_id, index), None) is None:
+                spends.append((prev_tx_id, index))
+            inputs.append((owner, amount))
+            delta -= utxo_hash_element(prev_tx_id, index, amount, owner)
+        outputs = []
+        for index, (amount, address) in enumerate(block.iter_outputs(i)):
+            address = str(address, "utf-8")
+            creates[(tx_id, index)] = (amount, address)
+            outputs.append((address, amount))
+            delta += utxo_hash_element(tx_id, index, amount, address)
+        if index_addresses:
+            entries.append((tx_id, inputs, outputs))
+
+    if block.total_fees > 0:
+        coinbase_tx_id, miner = block.coinbase_tx_id, block.miner
+        creates[(coinbase_tx_id, 0)] = (block.total_fees, miner)
+        if index_addresses:
+            entries.append((coinbase_tx_id, [], [(miner, block.total_fees)]))
+        delta += utxo_hash_element(coinbase_tx_id, 0, block.total_fees, miner)
+
+    payload.release()
+    return {
+        "height": height,
+        "spends": spends,
+        "creates": [(tx_id, index, amount, owner) for (tx_id, index), (amount, owner) in creates.items()],
+        "hash_delta": delta % SET_HASH_MODULUS,
+        "entries": entries,
+        "utxo_set_hash": block.utxo_set_hash
+    }
+
+# returns one worker per cpu besides the applying process
+def default_workers() -> int:
+    return max(0, (os.cpu_count() or 1) - 1)
+
+# prints one progress line
+def print_progress(height: int, tip: int, blocks_per_second: float) -> None:
+    print(f"reindexed {height + 1}/{tip + 1} blocks ({blocks_per_second:.0f} blocks/s)")
+
+# rebuilds the utxo set, address index and set hash from a block file: workers check, parse and hash
+# blocks in parallel while this process applies them strictly in height order, checking each block's
+# stored set hash. by default one worker per spare cpu; workers=0 does everything in this process.
+# index_addresses=False skips the address index for callers that only want the utxo set
+def reindex(
+    path: str,
+    utxo_manager: Optional[UTXOManager] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[Callable[[int, int, float], None]] = print_progress,
+    index_addresses: bool = True
+) -> Dict[str, object]:
+    if utxo_manager is None:
+        utxo_manager = UTXOManager()
+    if utxo_manager.size():
+        raise ValueError("reindex needs an empty utxo set")
+
+    store = BlockStore(path)
+    tasks = [
+        (height, start, length, crc, index_addresses)
+        for height, (start, length, crc) in enumerate(store.records)
+    ]
+    store.close()
+    if not tasks:
+        raise ValueError(f"{path} holds no blocks")
+
+    if workers is None:
+        workers = default_workers()
+    # block 0 holds genesis, which the live index never sees either
+    address_index = AddressIndex() if index_addresses else None
+    tip = len(tasks) - 1
+
+    start = time.perf_counter()
+    last_report = start
+    pool = multiprocessing.Pool(workers, _open_worker_map, (path,)) if workers > 0 else None
+    try:
+        if pool is None:
+            _open_worker_map(path)
+            parsed_blocks = map(_parse_block, tasks)
+        else:
+            parsed_blocks = pool.imap(_parse_block, tasks, chunk_size)
+
+        for parsed in parsed_blocks:
+            height = parsed["height"]
+            failures = utxo_manager.apply_block(parsed["spends"], parsed["creates"], parsed["hash_delta"])
+            if failures:
+                utxo, reason = failures[0]
+                raise ValueError(f"block {height}: utxo {utxo} {reason}")
+            if parsed["utxo_set_hash"] is not None and parsed["utxo_set_hash"] != utxo_manager.get_set_hash():
+                raise ValueError(f"block {height}: utxo set hash does not match the stored hash")
+
+            if address_index is not None and height > 0:
+                for tx_id, inputs, outputs in parsed["entries"]:
+                    address_index.index_transaction(height, tx_id, inputs, outputs)
+
+            now = time.perf_counter()
+            if progress is not None and (now - last_report >= PROGRESS_INTERVAL or height == tip):
+                progress(height, tip, (height + 1) / (now - start) if now > start else 0.0)
+                last_report = now
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        else:
+            _close_worker_map()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "blocks": len(tasks),
+        "tip_height": tip,
+        "workers": workers,
+        "elapsed_seconds": elapsed,
+        "blocks_per_second": len(tasks) / elapsed if elapsed > 0 else 0.0,
+        "utxo_set_size": utxo_manager.size(),
+        "utxo_set_hash": utxo_manager.get_set_hash(),
+        "utxo_manager": utxo_manager,
+        "address_index": address_index
+    }
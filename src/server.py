@@ -0,0 +1,248 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from src import block, metrics
+from src.utxo_manager import UTXOManager, setup_genesis_utxos
+from src.mempool import Mempool
+from src.fee_estimator import FeeEstimator
+from src.transaction import Transaction, create_transaction, DEFAULT_FEE
+from src.pagination import DEFAULT_PAGE_SIZE
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+import argparse
+import json
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+
+# largest request body read, in bytes
+MAX_BODY_BYTES = 64 * 1024
+
+# transactions mined per block when a request doesn't say
+DEFAULT_SERVE_BLOCK_TXS = 5
+
+# returns a transaction as plain data
+def transaction_summary(tx: Transaction) -> dict:
+    return {
+        "tx_id": tx.tx_id,
+        "inputs": [[inp.prev_tx_id, inp.output_index] for inp in tx.inputs],
+        "outputs": [[out.amount, out.address] for out in tx.outputs],
+        "fee": tx.fee,
+        "size": tx.size(),
+        "replaceable": tx.replaceable
+    }
+
+# reads an optional integer query parameter
+def _int_param(query: Dict[str, List[str]], name: str) -> Optional[int]:
+    values = query.get(name)
+    if not values:
+        return None
+    try:
+        return int(values[0])
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {values[0]}")
+
+# reads the page size query parameter
+def _limit_param(query: Dict[str, List[str]]) -> int:
+    limit = _int_param(query, "limit")
+    return DEFAULT_PAGE_SIZE if limit is None else limit
+
+# reads an optional outpoint cursor written as tx_id:index
+def _outpoint_param(query: Dict[str, List[str]], name: str) -> Optional[Tuple[str, int]]:
+    values = query.get(name)
+    if not values:
+        return None
+    tx_id, _, index = values[0].rpartition(":")
+    try:
+        return tx_id, int(index)
+    except ValueError:
+        raise ValueError(f"{name} must be tx_id:index, got {values[0]}")
+
+# reads an optional string query parameter
+def _str_param(query: Dict[str, List[str]], name: str) -> Optional[str]:
+    values = query.get(name)
+    return values[0] if values else None
+
+# json api over one utxo set and mempool; the server handles one request at a time, so handlers
+# never race each other on the shared state
+class NodeHandler(BaseHTTPRequestHandler):
+    # returns the node summary
+    def get_status(self, query: Dict[str, List[str]]) -> Tuple[int, dict]:
+        utxo_manager, mempool = self.server.utxo_manager, self.server.mempool
+        return 200, {
+            "block_height": block.get_current_block_height(),
+            "utxo_set_size": utxo_manager.size(),
+            "utxo_set_hash": utxo_manager.get_set_hash(),
+            "mempool": mempool.get_statistics()
+        }
+
+    # returns an address's confirmed balance
+    def get_balance(self, query: Dict[str, List[str]]) -> Tuple[int, dict]:
+        address = _str_param(query, "address")
+        if not address:
+            raise ValueError("address is required")
+        return 200, {"address": address, "balance": self.server.utxo_manager.get_balance(address)}
+
+    # returns one page of utxos in outpoint order, optionally of one owner
+    def get_utxos(self, query: Dict[str, List[str]]) -> Tuple[int, dict]:
+        page, cursor = self.server.utxo_manager.page_utxos(
+            _outpoint_param(query, "cursor"), _limit_param(query), _str_param(query, "owner")
+        )
+        next_cursor = None if cursor is None else f"{cursor[0]}:{cursor[1]}"
+        return 200, {"utxos": [list(utxo) for utxo in page], "next_cursor": next_cursor}
+
+    # returns one page of mempool transactions in admission order; the cursor is an admission sequence
+    def get_mempool(self, query: Dict[str, List[str]]) -> Tuple[int, dict]:
+        page, cursor = self.server.mempool.page_transactions(
+            _int_param(query, "cursor"), _limit_param(query), _str_param(query, "owner")
+        )
+        return 200, {"transactions": [transaction_summary(tx) for tx in page], "next_cursor": cursor}
+
+    # returns every metric
+    def get_metrics(self, query: Dict[str, List[str]]) -> Tuple[int, dict]:
+        return 200, metrics.REGISTRY.snapshot()
+
+    # builds a payment from the sender's utxos and submits it to the mempool
+    def post_transactions(self, body: dict) -> Tuple[int, dict]:
+        utxo_manager, mempool = self.server.utxo_manager, self.server.mempool
+        try:
+            sender, recipient, amount = body["sender"], body["recipient"], float(body["amount"])
+        except KeyError as e:
+            raise ValueError(f"missing field {e.args[0]}")
+        tx = create_transaction(
+            sender, recipient, amount, utxo_manager,
+            replaceable=bool(body.get("replaceable", False)),
+            fee=float(body.get("fee", DEFAULT_FEE)),
+            mempool=mempool
+        )
+        success, message = mempool.add_transaction(tx, utxo_manager)
+        if not success:
+            return 409, {"error": message}
+        return 201, transaction_summary(tx)
+
+    # mines a block from the mempool
+    def post_blocks(self, body: dict) -> Tuple[int, dict]:
+        miner = body.get("miner")
+        if not miner:
+            raise ValueError("miner is required")
+        num_txs = int(body.get("num_txs", DEFAULT_SERVE_BLOCK_TXS))
+        # called through the module so enabled metrics see it
+        mined = block.mine_block(miner, self.server.mempool, self.server.utxo_manager, num_txs, verbose=False)
+        if mined is None:
+            return 409, {"error": "no transactions to mine"}
+        return 201, {
+            "block_height": mined.block_height,
+            "miner": mined.miner,
+            "total_fees": mined.total_fees,
+            "transactions": [tx.tx_id for tx in mined.transactions],
+            "utxo_set_hash": mined.utxo_set_hash
+        }
+
+    GET_ROUTES: Dict[str, Callable] = {
+        "/status": get_status,
+        "/balance": get_balance,
+        "/utxos": get_utxos,
+        "/mempool": get_mempool,
+        "/metrics": get_metrics
+    }
+    POST_ROUTES: Dict[str, Callable] = {
+        "/transactions": post_transactions,
+        "/blocks": post_blocks
+    }
+
+    # handles a get request
+    def do_GET(self):
+        url = urlparse(self.path)
+        route = self.GET_ROUTES.get(url.path)
+        if route is None:
+            self.send_json(404, {"error": f"unknown path {url.path}"})
+            return
+        self.dispatch(lambda: route(self, parse_qs(url.query)))
+
+    # handles a post request with a json object body
+    def do_POST(self):
+        route = self.POST_ROUTES.get(urlparse(self.path).path)
+        if route is None:
+            self.send_json(404, {"error": f"unknown path {self.path}"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self.send_json(413, {"error": f"request body over {MAX_BODY_BYTES} bytes"})
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self.send_json(400, {"error": f"invalid json: {e}"})
+            return
+        if not isinstance(body, dict):
+            self.send_json(400, {"error": "request body must be a json object"})
+            return
+        self.dispatch(lambda: route(self, body))
+
+    # runs a route, turning bad input into a 400
+    def dispatch(self, handle: Callable[[], Tuple[int, dict]]) -> None:
+        try:
+            status, payload = handle()
+        except (ValueError, KeyError) as e:
+            # a key error's str() is quoted, so report its message as given
+            status, payload = 400, {"error": str(e.args[0]) if e.args else str(e)}
+        self.send_json(status, payload)
+
+    # writes a json response
+    def send_json(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # logs requests unless the server is quiet
+    def log_message(self, format: str, *args) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+# returns a server bound to host and port (0 picks a free port) serving the given state
+def make_server(
+    utxo_manager: UTXOManager,
+    mempool: Mempool,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    quiet: bool = False
+) -> HTTPServer:
+    server = HTTPServer((host, port), NodeHandler)
+    server.utxo_manager = utxo_manager
+    server.mempool = mempool
+    server.quiet = quiet
+    return server
+
+# parses the serve subcommand's options
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m src serve", description="serve the simulator as a json api")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on (0 picks a free one)")
+    parser.add_argument("--no-metrics", action="store_true",
+                        help="leave entry points uninstrumented (zero overhead)")
+    parser.add_argument("--no-chains", action="store_true",
+                        help="only spend confirmed outputs, hiding unconfirmed change from the wallet view")
+    parser.add_argument("--quiet", action="store_true", help="don't log requests")
+    return parser.parse_args(argv)
+
+# serves a fresh genesis state until interrupted, without touching saved state
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    utxo_manager = UTXOManager()
+    mempool = Mempool(fee_estimator=FeeEstimator(), allow_chains=not args.no_chains)
+    setup_genesis_utxos(utxo_manager)
+    if not args.no_metrics:
+        metrics.enable()
+        metrics.register_gauges(utxo_manager, mempool)
+
+    server = make_server(utxo_manager, mempool, args.host, args.port, args.quiet)
+    host, port = server.server_address[:2]
+    print(f"serving on http://{host}:{port} (ctrl-c to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nstopping server...")
+    finally:
+        server.server_close()
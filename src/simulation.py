@@ -0,0 +1,210 @@
+from typing import Dict, List, Optional, Tuple
+from src import block
+from src.block_store import BlockStore, genesis_block
+from src.utxo_manager import UTXOManager
+from src.mempool import Mempool, DEFAULT_MAX_BYTES
+from src.transaction import create_transaction
+import heapq
+import math
+import random
+import time
+
+# event kinds; simultaneous events run in this order
+EVENT_BLOCK = 0
+EVENT_TX = 1
+EVENT_SAMPLE = 2
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# default network shape: mean seconds between blocks and transactions per second
+DEFAULT_BLOCK_INTERVAL = 600.0
+DEFAULT_TX_RATE = 0.25
+
+# default population and capacities
+DEFAULT_WALLETS = 100
+DEFAULT_MINERS = 5
+DEFAULT_BLOCK_TXS = 200
+DEFAULT_MEMPOOL_BYTES = DEFAULT_MAX_BYTES
+
+# seconds of simulated time between mempool depth samples
+DEFAULT_SAMPLE_INTERVAL = 600.0
+
+# coins each wallet starts with
+DEFAULT_WALLET_BALANCE = 10.0
+
+# payment amounts and fees are drawn uniformly from these ranges
+PAYMENT_RANGE = (0.01, 1.0)
+FEE_RANGE = (0.0001, 0.002)
+
+# percentiles reported for confirmation delays
+REPORTED_PERCENTILES = (50, 90, 99)
+
+# depth samples shown in the text report
+REPORT_DEPTH_LINES = 24
+
+# returns the value below which percent of the sorted values fall
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(len(sorted_values) * percent / 100))
+    return sorted_values[rank - 1]
+
+# runs a seeded discrete-event simulation of wallets paying each other and miners finding blocks:
+# transaction arrivals are a poisson process at tx_rate, block intervals exponential around block_interval.
+# uses its own utxo set and mempool, and restarts the global chain from height 0; blocks (genesis first)
+# are appended to block_store if one is given
+def run_simulation(
+    days: float = 1.0,
+    seed: int = 0,
+    wallets: int = DEFAULT_WALLETS,
+    miners: int = DEFAULT_MINERS,
+    tx_rate: float = DEFAULT_TX_RATE,
+    block_interval: float = DEFAULT_BLOCK_INTERVAL,
+    block_txs: int = DEFAULT_BLOCK_TXS,
+    mempool_bytes: int = DEFAULT_MEMPOOL_BYTES,
+    sample_interval: float = DEFAULT_SAMPLE_INTERVAL,
+    block_store: Optional[BlockStore] = None
+) -> Dict[str, object]:
+    if days <= 0 or tx_rate <= 0 or block_interval <= 0 or sample_interval <= 0:
+        raise ValueError("days, rates and intervals must be positive")
+    if wallets < 2 or miners < 1:
+        raise ValueError("need at least two wallets and one miner")
+    if block_store is not None and len(block_store):
+        raise ValueError("a simulation needs an empty block file")
+
+    rng = random.Random(seed)
+    end = days * SECONDS_PER_DAY
+    now = 0.0
+
+    utxo_manager = UTXOManager()
+    mempool = Mempool(max_bytes=mempool_bytes, allow_chains=True, clock=lambda: now)
+    block.reset_block_height()
+
+    names = [f"wallet{i}" for i in range(wallets)]
+    for index, name in enumerate(names):
+        utxo_manager.add_utxo("genesis", index, DEFAULT_WALLET_BALANCE, name)
+
+    counts = {
+        "created": 0,
+        "unfunded": 0,
+        "accepted": 0,
+        "rejected": 0,
+        "blocks": 0,
+        "empty_intervals": 0,
+        "confirmed": 0
+    }
+    arrivals: Dict[str, float] = {}
+    delays: List[float] = []
+    depth: List[Tuple[float, int]] = []
+    revenue: Dict[str, float] = {}
+
+    # (time, kind, sequence) so ties are broken deterministically
+    events: List[Tuple[float, int, int]] = []
+    sequence = 0
+
+    def schedule(at: float, kind: int) -> None:
+        nonlocal sequence
+        sequence += 1
+        heapq.heappush(events, (at, kind, sequence))
+
+    schedule(rng.expovariate(tx_rate), EVENT_TX)
+    schedule(rng.expovariate(1 / block_interval), EVENT_BLOCK)
+    schedule(0.0, EVENT_SAMPLE)
+
+    if block_store is not None:
+        block_store.append(genesis_block(utxo_manager, timestamp=0))
+
+    start = time.perf_counter()
+    while events and events[0][0] < end:
+        now, kind, _ = heapq.heappop(events)
+
+        if kind == EVENT_TX:
+            sender, recipient = rng.sample(names, 2)
+            amount = round(rng.uniform(*PAYMENT_RANGE), 8)
+            fee = round(rng.uniform(*FEE_RANGE), 8)
+            try:
+                tx = create_transaction(
+                    sender, recipient, amount, utxo_manager,
+                    fee=fee, mempool=mempool, tx_id=f"sim_{counts['created'] + counts['unfunded']}"
+                )
+            except ValueError:
+                counts["unfunded"] += 1
+            else:
+                counts["created"] += 1
+                success, _ = mempool.add_transaction(tx, utxo_manager)
+                if success:
+                    counts["accepted"] += 1
+                    arrivals[tx.tx_id] = now
+                else:
+                    counts["rejected"] += 1
+            schedule(now + rng.expovariate(tx_rate), EVENT_TX)
+
+        elif kind == EVENT_BLOCK:
+            miner = f"miner{rng.randrange(miners)}"
+            mined = block.mine_block(
+                miner, mempool, utxo_manager, block_txs, verbose=False, timestamp=int(now), block_store=block_store
+            )
+            if mined is None:
+                counts["empty_intervals"] += 1
+            else:
+                counts["blocks"] += 1
+                counts["confirmed"] += len(mined.transactions)
+                revenue[miner] = revenue.get(miner, 0.0) + mined.total_fees
+                for tx in mined.transactions:
+                    delays.append(now - arrivals.pop(tx.tx_id))
+            schedule(now + rng.expovariate(1 / block_interval), EVENT_BLOCK)
+
+        else:
+            depth.append((now, mempool.size()))
+            schedule(now + sample_interval, EVENT_SAMPLE)
+
+    elapsed = time.perf_counter() - start
+    delays.sort()
+    sizes = [size for _, size in depth]
+
+    summary: Dict[str, object] = dict(counts)
+    summary["seed"] = seed
+    summary["simulated_seconds"] = end
+    summary["wall_seconds"] = elapsed
+    summary["speedup"] = end / elapsed if elapsed > 0 else 0.0
+    summary["mempool_depth"] = depth
+    summary["max_depth"] = max(sizes, default=0)
+    summary["mean_depth"] = sum(sizes) / len(sizes) if sizes else 0.0
+    summary["unconfirmed"] = mempool.size()
+    summary["confirmation_delays"] = {
+        "count": len(delays),
+        "mean": sum(delays) / len(delays) if delays else 0.0,
+        "max": delays[-1] if delays else 0.0,
+        **{f"p{p}": _percentile(delays, p) for p in REPORTED_PERCENTILES}
+    }
+    summary["miner_revenue"] = dict(sorted(revenue.items()))
+    summary["utxo_set_hash"] = utxo_manager.get_set_hash()
+    return summary
+
+# returns a human-readable simulation report
+def format_report(summary: Dict[str, object]) -> str:
+    delays = summary["confirmation_delays"]
+    lines = [
+        "simulation report:",
+        f"  simulated {summary['simulated_seconds'] / 3600:.1f} h in {summary['wall_seconds']:.2f} s "
+        f"({summary['speedup']:.0f}x real time, seed {summary['seed']})",
+        f"  transactions: {summary['accepted']} accepted, {summary['rejected']} rejected, "
+        f"{summary['unfunded']} unfunded, {summary['unconfirmed']} still pending",
+        f"  blocks: {summary['blocks']} confirming {summary['confirmed']} transactions "
+        f"({summary['empty_intervals']} intervals with nothing to mine)",
+        f"  confirmation delay (s): mean={delays['mean']:.0f} "
+        + " ".join(f"p{p}={delays[f'p{p}']:.0f}" for p in REPORTED_PERCENTILES)
+        + f" max={delays['max']:.0f}",
+        f"  mempool depth: mean={summary['mean_depth']:.1f} max={summary['max_depth']}"
+    ]
+
+    depth = summary["mempool_depth"]
+    step = max(1, math.ceil(len(depth) / REPORT_DEPTH_LINES))
+    for at, size in depth[::step]:
+        lines.append(f"    t={at / 3600:6.2f} h  {size:6d} {'#' * min(size // 10, 60)}")
+
+    lines.append("  miner revenue:")
+    for miner, fees in summary["miner_revenue"].items():
+        lines.append(f"    {miner}: {fees:.8f} btc")
+    lines.append(f"  utxo set hash: {summary['utxo_set_hash']}")
+    return "\n".join(lines)
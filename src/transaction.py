@@ -1,40 +1,80 @@
-import sys
-from pathlib import Path
-sys.path.insert(0, str(Path(__file__).parent.parent))
-from typing import List, Set, Tuple
+from typing import List, Optional, Set, Tuple
+from src.address_registry import address_id, address_of
 import time
 import random
 
+# number of satoshis in one btc, used for fee rates
+SATOSHIS_PER_BTC = 100_000_000
+
+# fee paid by create_transaction when the caller doesn't choose one
+DEFAULT_FEE = 0.001
+
+# approximate cpython footprint of the fixed parts of each object (instance, __dict__ or slots, lists, numbers)
+TX_OBJECT_BYTES = 600
+INPUT_OBJECT_BYTES = 100
+OUTPUT_OBJECT_BYTES = 80
+STR_HEADER_BYTES = 49
+
 # represents a transaction input
 class TransactionInput:
+    __slots__ = ("prev_tx_id", "output_index", "owner_id")
+
     # initializes a transaction input
     def __init__(self, prev_tx_id: str, output_index: int, owner: str):
         self.prev_tx_id = prev_tx_id
         self.output_index = output_index
-        self.owner = owner
+        self.owner_id = address_id(owner)
+
+    # returns the owner's address
+    @property
+    def owner(self) -> str:
+        return address_of(self.owner_id)
     
     def __repr__(self):
         return f"input({self.prev_tx_id}:{self.output_index} from {self.owner})"
 
+    # converts the input to a json-friendly list
+    def to_list(self) -> list:
+        return [self.prev_tx_id, self.output_index, self.owner]
+
 # represents a transaction output
 class TransactionOutput:
+    __slots__ = ("amount", "address_id")
+
     # initializes a transaction output
     def __init__(self, amount: float, address: str):
         self.amount = amount
-        self.address = address
+        self.address_id = address_id(address)
+
+    # returns the recipient's address
+    @property
+    def address(self) -> str:
+        return address_of(self.address_id)
     
     def __repr__(self):
         return f"output({self.amount} btc to {self.address})"
 
+    # converts the output to a json-friendly list
+    def to_list(self) -> list:
+        return [self.amount, self.address]
+
 # defines transaction structure
 class Transaction:
     # creates a new transaction
-    def __init__(self, tx_id: str, inputs: List[TransactionInput], outputs: List[TransactionOutput]):
+    def __init__(
+        self,
+        tx_id: str,
+        inputs: List[TransactionInput],
+        outputs: List[TransactionOutput],
+        replaceable: bool = False
+    ):
         self.tx_id = tx_id
         self.inputs = inputs
         self.outputs = outputs
+        self.replaceable = replaceable
         self.fee = 0.0
         self.is_validated = False
+        self._size = None
     
     # calculates total input amount
     def calculate_input_sum(self, utxo_manager) -> float:
@@ -48,6 +88,22 @@ class Transaction:
     def calculate_output_sum(self) -> float:
         return sum(out.amount for out in self.outputs)
     
+    # returns the estimated in-memory footprint of the transaction in bytes
+    def size(self) -> int:
+        if self._size is None:
+            total = TX_OBJECT_BYTES + STR_HEADER_BYTES + len(self.tx_id)
+            for inp in self.inputs:
+                # the owner is an address id; its string lives once in the registry
+                total += INPUT_OBJECT_BYTES + STR_HEADER_BYTES + len(inp.prev_tx_id)
+            for out in self.outputs:
+                total += OUTPUT_OBJECT_BYTES
+            self._size = total
+        return self._size
+
+    # returns the fee rate in satoshis per byte of footprint
+    def fee_rate(self) -> float:
+        return self.fee * SATOSHIS_PER_BTC / self.size()
+
     # validates transaction
     def is_valid(self, utxo_manager, mempool_spent_utxos: Set[Tuple[str, int]] = None) -> Tuple[bool, str]:
         try:
@@ -57,8 +113,27 @@ class Transaction:
         except ValueError as e:
             return False, str(e)
     
+    # converts the transaction to a json-friendly dict
+    def to_dict(self) -> dict:
+        data = {
+            "id": self.tx_id,
+            "in": [inp.to_list() for inp in self.inputs],
+            "out": [out.to_list() for out in self.outputs]
+        }
+        if self.replaceable:
+            data["rbf"] = True
+        return data
+
+    # rebuilds a transaction from to_dict() output
+    @classmethod
+    def from_dict(cls, data: dict) -> "Transaction":
+        inputs = [TransactionInput(tx_id, index, owner) for tx_id, index, owner in data["in"]]
+        outputs = [TransactionOutput(amount, address) for amount, address in data["out"]]
+        return cls(data["id"], inputs, outputs, data.get("rbf", False))
+
     def __repr__(self):
-        return f"transaction({self.tx_id}, {len(self.inputs)} inputs, {len(self.outputs)} outputs, fee={self.fee:.8f})"
+        rbf = ", rbf" if self.replaceable else ""
+        return f"transaction({self.tx_id}, {len(self.inputs)} inputs, {len(self.outputs)} outputs, fee={self.fee:.8f}{rbf})"
 
 # generates a unique transaction id
 def generate_tx_id(sender: str, recipient: str = None) -> str:
@@ -98,10 +173,10 @@ def validate_transaction(
             raise ValueError(f"utxo {utxo_key} does not exist or already spent")
 
         utxo_amount = utxo_manager.get_utxo_amount(inp.prev_tx_id, inp.output_index)
-        utxo_owner = utxo_manager.get_utxo_owner(inp.prev_tx_id, inp.output_index)
+        utxo_owner_id = utxo_manager.get_utxo_owner_id(inp.prev_tx_id, inp.output_index)
 
-        if utxo_owner != inp.owner:
-            raise ValueError(f"input owner mismatch: utxo owned by {utxo_owner}, claimed by {inp.owner}")
+        if utxo_owner_id != inp.owner_id:
+            raise ValueError(f"input owner mismatch: utxo owned by {address_of(utxo_owner_id)}, claimed by {inp.owner}")
 
         if utxo_key in mempool_spent_utxos:
             raise ValueError(f"utxo {utxo_key} already spent by tx_{utxo_key[0]}")
@@ -130,13 +205,21 @@ def create_transaction(
     recipient: str,
     amount: float,
     utxo_manager,
-    change_address: str = None
+    change_address: str = None,
+    replaceable: bool = False,
+    fee: float = DEFAULT_FEE,
+    mempool=None,
+    tx_id: Optional[str] = None
 ) -> Transaction:
     
     if change_address is None:
         change_address = sender
     
-    available_utxos = utxo_manager.get_utxos_for_owner(sender)
+    # with a mempool, skip coins already spent by pending transactions and use unconfirmed change
+    if mempool is not None:
+        available_utxos = mempool.get_spendable_utxos(sender, utxo_manager)
+    else:
+        available_utxos = utxo_manager.get_utxos_for_owner(sender)
     
     if not available_utxos:
         raise ValueError(f"{sender} has no utxos")
@@ -146,27 +229,28 @@ def create_transaction(
     
     available_utxos.sort(key=lambda x: x[2], reverse=True)
     
-    for tx_id, index, utxo_amount in available_utxos:
-        selected_utxos.append((tx_id, index, utxo_amount))
+    for prev_tx_id, index, utxo_amount in available_utxos:
+        selected_utxos.append((prev_tx_id, index, utxo_amount))
         total_selected += utxo_amount
         
-        if total_selected >= amount + 0.001:
+        if total_selected >= amount + fee:
             break
     
     if total_selected < amount:
         raise ValueError(f"insufficient funds: have {total_selected} btc, need {amount} btc")
     
     inputs = [
-        TransactionInput(tx_id, index, sender)
-        for tx_id, index, _ in selected_utxos
+        TransactionInput(prev_tx_id, index, sender)
+        for prev_tx_id, index, _ in selected_utxos
     ]
     
     outputs = [TransactionOutput(amount, recipient)]
     
-    change = total_selected - amount - 0.001
+    change = total_selected - amount - fee
     if change > 0.0001:
         outputs.append(TransactionOutput(change, change_address))
     
-    tx_id = generate_tx_id(sender, recipient)
+    if tx_id is None:
+        tx_id = generate_tx_id(sender, recipient)
     
-    return Transaction(tx_id, inputs, outputs)
+    return Transaction(tx_id, inputs, outputs, replaceable)
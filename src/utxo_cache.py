@@ -0,0 +1,291 @@
+from typing import Dict, Tuple, List, Optional, Iterator, Set
+from collections import OrderedDict
+from src.utxo_manager import UTXOManager, UTXORecord
+from src.address_registry import REGISTRY, address_id
+import sqlite3
+import time
+
+# default number of outpoints kept in memory
+DEFAULT_CACHE_ENTRIES = 100_000
+
+# stores utxos in a sqlite file, indexed by outpoint and by owner
+class SQLiteUTXOStore:
+    # opens (or creates) the store at path
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS utxos ("
+            "tx_id TEXT NOT NULL, idx INTEGER NOT NULL, amount REAL NOT NULL, owner TEXT NOT NULL, "
+            "PRIMARY KEY (tx_id, idx)) WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS utxos_owner ON utxos (owner)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.commit()
+
+    # returns the record for an outpoint, or None
+    def get(self, key: Tuple[str, int]) -> Optional[UTXORecord]:
+        row = self.conn.execute("SELECT amount, owner FROM utxos WHERE tx_id = ? AND idx = ?", key).fetchone()
+        if row is None:
+            return None
+        return UTXORecord(row[0], address_id(row[1]))
+
+    # writes puts and deletes plus metadata in one transaction
+    def write_batch(
+        self,
+        puts: List[Tuple[str, int, float, str]],
+        deletes: List[Tuple[str, int]],
+        meta: Dict[str, str]
+    ) -> None:
+        with self.conn:
+            self.conn.executemany("DELETE FROM utxos WHERE tx_id = ? AND idx = ?", deletes)
+            self.conn.executemany("INSERT OR REPLACE INTO utxos VALUES (?, ?, ?, ?)", puts)
+            self.conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", meta.items())
+
+    # deletes every utxo
+    def clear(self) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM utxos")
+
+    # iterates over every stored utxo
+    def iter_all(self) -> Iterator[Tuple[str, int, float, str]]:
+        return self.conn.execute("SELECT tx_id, idx, amount, owner FROM utxos")
+
+    # iterates over the stored output indexes of one transaction, using the outpoint key
+    def iter_tx(self, tx_id: str) -> Iterator[Tuple[int]]:
+        return self.conn.execute("SELECT idx FROM utxos WHERE tx_id = ?", (tx_id,))
+
+    # iterates over the stored utxos of one owner
+    def iter_owner(self, owner: str) -> Iterator[Tuple[str, int, float, str]]:
+        return self.conn.execute("SELECT tx_id, idx, amount, owner FROM utxos WHERE owner = ?", (owner,))
+
+    # returns the number of stored utxos
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM utxos").fetchone()[0]
+
+    # reads a metadata value
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    # closes the database
+    def close(self) -> None:
+        self.conn.close()
+
+# cached state of one outpoint: data is None once spent
+class CacheEntry:
+    __slots__ = ("data", "dirty", "fresh")
+
+    def __init__(self, data: Optional[UTXORecord], dirty: bool, fresh: bool):
+        self.data = data
+        # differs from what is on disk
+        self.dirty = dirty
+        # not on disk at all, so spending it never needs a disk write
+        self.fresh = fresh
+
+# utxo manager with a bounded lru cache in front of a sqlite store
+class CachedUTXOManager(UTXOManager):
+    # opens the store at path and restores its set hash
+    def __init__(self, path: str, max_entries: int = DEFAULT_CACHE_ENTRIES):
+        super().__init__()
+        self.store = SQLiteUTXOStore(path)
+        self.max_entries = max_entries
+        self.cache: "OrderedDict[Tuple[str, int], CacheEntry]" = OrderedDict()
+        self.dirty_keys: Set[Tuple[str, int]] = set()
+        self.hits = 0
+        self.misses = 0
+        self.flush_count = 0
+        self.last_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+        self._size = self.store.count()
+        stored_hash = self.store.get_meta("set_hash")
+        if stored_hash is not None:
+            self.set_hash = int(stored_hash, 16)
+        else:
+            self._rehash()
+
+    # returns the record for an outpoint, reading through to disk on a miss
+    def _lookup(self, key: Tuple[str, int]) -> Optional[UTXORecord]:
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return entry.data
+
+        self.misses += 1
+        data = self.store.get(key)
+        if data is not None:
+            self.cache[key] = CacheEntry(data, dirty=False, fresh=False)
+            self._index_owner(key, data)
+            self._trim()
+        return data
+
+    # outputs created by a block have never been flushed, so only the cache can hold them
+    def _lookup_created(self, key: Tuple[str, int]) -> Optional[UTXORecord]:
+        entry = self.cache.get(key)
+        return entry.data if entry is not None else None
+
+    # stores a record in the cache, marking it fresh when disk has never seen the outpoint
+    def _store(self, key: Tuple[str, int], data: UTXORecord) -> None:
+        # add_utxo looks the key up first and block outputs are new, so a missing entry means disk doesn't have it
+        entry = self.cache.get(key)
+        if entry is None:
+            self.cache[key] = CacheEntry(data, dirty=True, fresh=True)
+            self._size += 1
+        else:
+            if entry.data is None:
+                self._size += 1
+            self._unindex_owner(key, entry.data)
+            entry.data = data
+            entry.dirty = True
+            self.cache.move_to_end(key)
+        self._index_owner(key, data)
+        self.dirty_keys.add(key)
+        self._trim()
+
+    # spends an outpoint, dropping fresh entries without touching disk
+    def _delete(self, key: Tuple[str, int]) -> None:
+        entry = self.cache.get(key)
+        if entry is None:
+            # evicted since it was looked up, so it was clean and is on disk
+            self.cache[key] = CacheEntry(None, dirty=True, fresh=False)
+            self.dirty_keys.add(key)
+        else:
+            self._unindex_owner(key, entry.data)
+            if entry.fresh:
+                del self.cache[key]
+                self.dirty_keys.discard(key)
+            else:
+                entry.data = None
+                entry.dirty = True
+                self.dirty_keys.add(key)
+        self._size -= 1
+
+    # replaces the whole set on disk
+    def _replace_all(self, utxo_set: Dict[Tuple[str, int], UTXORecord]) -> None:
+        self.cache.clear()
+        self.owner_keys.clear()
+        self.dirty_keys.clear()
+        self.store.clear()
+        puts = [(tx_id, index, data.amount, data.owner) for (tx_id, index), data in utxo_set.items()]
+        self._size = len(puts)
+        self.store.write_batch(puts, [], {})
+
+    # iterates over disk records overlaid with the cache
+    def items(self) -> Iterator[Tuple[Tuple[str, int], UTXORecord]]:
+        for tx_id, index, amount, owner in self.store.iter_all():
+            key = (tx_id, index)
+            entry = self.cache.get(key)
+            if entry is None:
+                yield key, UTXORecord(amount, address_id(owner))
+            elif entry.data is not None:
+                yield key, entry.data
+        for key, entry in list(self.cache.items()):
+            if entry.fresh and entry.data is not None:
+                yield key, entry.data
+
+    # returns the number of utxos
+    def size(self) -> int:
+        return self._size
+
+    # checks the transaction's rows on disk against the cache; outputs not yet on disk are dirty,
+    # so only the dirty keys are searched for them
+    def has_unspent_outputs(self, tx_id: str) -> bool:
+        for key in self.dirty_keys:
+            if key[0] == tx_id and self.cache[key].data is not None:
+                return True
+        for (index,) in self.store.iter_tx(tx_id):
+            entry = self.cache.get((tx_id, index))
+            if entry is None or entry.data is not None:
+                return True
+        return False
+
+    # returns utxos for an owner using the store's owner index plus the cache's
+    def get_utxos_for_owner(self, owner: str) -> List[Tuple[str, int, float]]:
+        results = {}
+        # owners stored by an earlier process are on disk before this one has interned them
+        for tx_id, index, amount, _ in self.store.iter_owner(owner):
+            key = (tx_id, index)
+            if key not in self.cache:
+                results[key] = amount
+        owner_id = REGISTRY.lookup(owner)
+        if owner_id is not None:
+            for key in self.owner_keys.get(owner_id, ()):
+                results[key] = self.cache[key].data.amount
+        return [(tx_id, index, amount) for (tx_id, index), amount in results.items()]
+
+    # calculates balance for an owner without scanning the whole set
+    def get_balance(self, owner: str) -> float:
+        return sum(amount for _, _, amount in self.get_utxos_for_owner(owner))
+
+    # writes all dirty entries to disk in one batch
+    def flush(self) -> None:
+        start = time.perf_counter()
+
+        puts = []
+        deletes = []
+        for key in self.dirty_keys:
+            entry = self.cache[key]
+            if entry.data is None:
+                deletes.append(key)
+            else:
+                puts.append((key[0], key[1], entry.data.amount, entry.data.owner))
+
+        self.store.write_batch(puts, deletes, {"set_hash": self.get_set_hash()})
+
+        for key in deletes:
+            del self.cache[key]
+        for key in self.dirty_keys:
+            entry = self.cache.get(key)
+            if entry is not None:
+                entry.dirty = False
+                entry.fresh = False
+        self.dirty_keys.clear()
+        self._trim()
+
+        self.flush_count += 1
+        self.last_flush_seconds = time.perf_counter() - start
+        self.total_flush_seconds += self.last_flush_seconds
+
+    # evicts least recently used clean entries until the cache fits (dirty ones wait for a flush)
+    def _trim(self) -> None:
+        while len(self.cache) > self.max_entries:
+            key, entry = next(iter(self.cache.items()))
+            if entry.dirty:
+                break
+            del self.cache[key]
+            self._unindex_owner(key, entry.data)
+
+    # flushes, then returns a rollback point instead of copying the set
+    def get_snapshot(self) -> Dict[str, object]:
+        self.flush()
+        return {"set_hash": self.set_hash, "size": self._size}
+
+    # rolls back to a get_snapshot() point by dropping everything written since its flush
+    def load_snapshot(self, snapshot: Dict[str, object]) -> None:
+        for key in self.dirty_keys:
+            self._unindex_owner(key, self.cache.pop(key).data)
+        self.dirty_keys.clear()
+        self.set_hash = snapshot["set_hash"]
+        self._size = snapshot["size"]
+
+    # returns cache hit rate and flush latency
+    def cache_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.cache),
+            "max_entries": self.max_entries,
+            "dirty": len(self.dirty_keys),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "flushes": self.flush_count,
+            "last_flush_seconds": self.last_flush_seconds,
+            "avg_flush_seconds": self.total_flush_seconds / self.flush_count if self.flush_count else 0.0
+        }
+
+    # flushes pending changes and closes the store
+    def close(self) -> None:
+        self.flush()
+        self.store.close()
@@ -1,14 +1,68 @@
-import sys
-from pathlib import Path
-sys.path.insert(0, str(Path(__file__).parent.parent))
-from typing import Dict, Tuple, List
-import copy
+from typing import Dict, Tuple, List, Optional, Iterator, Set
+from src.pagination import paginate_by_key, DEFAULT_PAGE_SIZE
+from src.address_registry import REGISTRY, address_id, address_of
+import heapq
+import hashlib
+import json
+import os
+
+# modulus of the additive set hash
+SET_HASH_MODULUS = 2 ** 256
+
+# version tag written at the top of utxo snapshot files
+UTXO_SNAPSHOT_VERSION = 1
+
+# utxos written per line of a snapshot file
+DEFAULT_SNAPSHOT_CHUNK = 10_000
+
+# (amount, owner) of each output of the "genesis" transaction a fresh cli or server state starts from
+GENESIS_OUTPUTS = ((50.0, "alice"), (30.0, "bob"), (20.0, "charlie"), (10.0, "david"), (5.0, "eve"))
+
+# hashes one utxo into an element of the additive set hash
+def utxo_hash_element(tx_id: str, index: int, amount: float, owner: str) -> int:
+    data = f"{tx_id}:{index}:{float(amount)!r}:{owner}".encode()
+    return int.from_bytes(hashlib.sha256(data).digest(), "big")
+
+# amount and owner of one utxo; immutable once stored, so snapshots can share records
+class UTXORecord:
+    __slots__ = ("amount", "owner_id")
+
+    # initializes a record for an owner's address id
+    def __init__(self, amount: float, owner_id: int):
+        self.amount = amount
+        self.owner_id = owner_id
+
+    # returns the owner's address
+    @property
+    def owner(self) -> str:
+        return address_of(self.owner_id)
+
+    # lets callers read record["amount"] and record["owner"] like a dict
+    def __getitem__(self, field: str) -> object:
+        if field == "amount":
+            return self.amount
+        if field == "owner":
+            return self.owner
+        raise KeyError(field)
+
+    def __eq__(self, other) -> bool:
+        return (isinstance(other, UTXORecord)
+                and self.amount == other.amount and self.owner_id == other.owner_id)
+
+    def __repr__(self):
+        return f"utxo_record({self.amount} btc, {self.owner})"
 
 # manages unspent transaction outputs (utxos)
 class UTXOManager:
     # initializes the utxo manager
     def __init__(self):
-        self.utxo_set: Dict[Tuple[str, int], Dict[str, object]] = {}
+        self.utxo_set: Dict[Tuple[str, int], UTXORecord] = {}
+        # unspent outputs left per transaction id, so a confirmed parent is recognized without a scan
+        self.unspent_per_tx: Dict[str, int] = {}
+        # outpoints of each owner address id (dicts as ordered sets), so wallet views don't scan the set
+        self.owner_keys: Dict[int, Dict[Tuple[str, int], None]] = {}
+        # sum of utxo_hash_element over the whole set, kept up to date on every change
+        self.set_hash = 0
 
     # adds a new utxo
     def add_utxo(self, tx_id: str, index: int, amount: float, owner: str) -> None:
@@ -16,75 +70,358 @@ class UTXOManager:
             raise ValueError(f"utxo amount must be positive, got {amount}")
 
         key = (tx_id, index)
-        self.utxo_set[key] = {
-            "amount": amount,
-            "owner": owner
-        }
+        old = self._lookup(key)
+        if old is not None:
+            self._unhash(key, old)
+
+        self._store(key, UTXORecord(amount, address_id(owner)))
+        self.set_hash = (self.set_hash + utxo_hash_element(tx_id, index, amount, owner)) % SET_HASH_MODULUS
 
     # removes a utxo
     def remove_utxo(self, tx_id: str, index: int) -> None:
         key = (tx_id, index)
-        if key not in self.utxo_set:
+        data = self._lookup(key)
+        if data is None:
             raise KeyError(f"utxo {key} does not exist or already spent")
 
-        del self.utxo_set[key]
+        self._delete(key)
+        self._unhash(key, data)
+
+    # checks every spend first, then applies all spends and creates in one pass and commits them;
+    # returns (outpoint, reason) for each failed spend, in which case nothing is applied. hash_delta,
+    # if given, is the precomputed hash change (creates minus spends) so nothing is rehashed here
+    def apply_block(
+        self,
+        spends: List[Tuple[str, int]],
+        creates: List[Tuple[str, int, float, str]],
+        hash_delta: Optional[int] = None
+    ) -> List[Tuple[Tuple[str, int], str]]:
+        failures = []
+        spent: Dict[Tuple[str, int], UTXORecord] = {}
+        for key in spends:
+            if key in spent:
+                failures.append((key, "spent twice in block"))
+                continue
+            data = self._lookup(key)
+            if data is None:
+                failures.append((key, "does not exist or already spent"))
+            else:
+                spent[key] = data
+        for tx_id, index, amount, _ in creates:
+            if amount <= 0:
+                failures.append(((tx_id, index), f"utxo amount must be positive, got {amount}"))
+        if failures:
+            return failures
+
+        delta = 0 if hash_delta is None else hash_delta
+        for key, data in spent.items():
+            self._delete(key)
+            if hash_delta is None:
+                delta -= utxo_hash_element(key[0], key[1], data.amount, data.owner)
+        for tx_id, index, amount, owner in creates:
+            key = (tx_id, index)
+            old = self._lookup_created(key)
+            if old is not None:
+                delta -= utxo_hash_element(tx_id, index, old.amount, old.owner)
+            self._store(key, UTXORecord(amount, address_id(owner)))
+            if hash_delta is None:
+                delta += utxo_hash_element(tx_id, index, amount, owner)
+        self.set_hash = (self.set_hash + delta) % SET_HASH_MODULUS
+
+        self.flush()
+        return []
+
+    # returns the stored record for an outpoint, or None if it is not in the set
+    def _lookup(self, key: Tuple[str, int]) -> Optional[UTXORecord]:
+        return self.utxo_set.get(key)
+
+    # returns the record an output a block creates would overwrite; block outputs are new, so
+    # storage with slow reads may skip them
+    def _lookup_created(self, key: Tuple[str, int]) -> Optional[UTXORecord]:
+        return self._lookup(key)
+
+    # adds an outpoint to its owner's index
+    def _index_owner(self, key: Tuple[str, int], data: UTXORecord) -> None:
+        self.owner_keys.setdefault(data.owner_id, {})[key] = None
+
+    # removes an outpoint from its owner's index
+    def _unindex_owner(self, key: Tuple[str, int], data: Optional[UTXORecord]) -> None:
+        if data is None:
+            return
+        keys = self.owner_keys.get(data.owner_id)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del self.owner_keys[data.owner_id]
+
+    # stores the record for an outpoint
+    def _store(self, key: Tuple[str, int], data: UTXORecord) -> None:
+        old = self.utxo_set.get(key)
+        if old is None:
+            self.unspent_per_tx[key[0]] = self.unspent_per_tx.get(key[0], 0) + 1
+        if old is None or old.owner_id != data.owner_id:
+            self._unindex_owner(key, old)
+            self._index_owner(key, data)
+        self.utxo_set[key] = data
+
+    # deletes the record for an existing outpoint
+    def _delete(self, key: Tuple[str, int]) -> None:
+        self._unindex_owner(key, self.utxo_set.pop(key))
+        left = self.unspent_per_tx[key[0]] - 1
+        if left:
+            self.unspent_per_tx[key[0]] = left
+        else:
+            del self.unspent_per_tx[key[0]]
+
+    # replaces every stored record at once
+    def _replace_all(self, utxo_set: Dict[Tuple[str, int], UTXORecord]) -> None:
+        self.utxo_set = utxo_set
+        self.unspent_per_tx = {}
+        self.owner_keys = {}
+        for key, data in utxo_set.items():
+            self.unspent_per_tx[key[0]] = self.unspent_per_tx.get(key[0], 0) + 1
+            self._index_owner(key, data)
+
+    # iterates over (outpoint, record) pairs of the whole set
+    def items(self) -> Iterator[Tuple[Tuple[str, int], UTXORecord]]:
+        return iter(self.utxo_set.items())
+
+    # returns the number of utxos
+    def size(self) -> int:
+        return len(self.utxo_set)
+
+    # persists pending changes; the in-memory manager has nothing to write
+    def flush(self) -> None:
+        pass
+
+    # removes a utxo's element from the set hash
+    def _unhash(self, key: Tuple[str, int], data: UTXORecord) -> None:
+        element = utxo_hash_element(key[0], key[1], data.amount, data.owner)
+        self.set_hash = (self.set_hash - element) % SET_HASH_MODULUS
+
+    # returns the rolling hash of the whole utxo set as hex
+    def get_set_hash(self) -> str:
+        return f"{self.set_hash:064x}"
+
+    # recomputes the set hash from scratch
+    def _rehash(self) -> None:
+        total = 0
+        for (tx_id, index), data in self.items():
+            total += utxo_hash_element(tx_id, index, data.amount, data.owner)
+        self.set_hash = total % SET_HASH_MODULUS
 
     # checks if a utxo exists
     def exists(self, tx_id: str, index: int) -> bool:
-        return (tx_id, index) in self.utxo_set
+        return self._lookup((tx_id, index)) is not None
 
-    # calculates balance for an owner
+    # checks if any output of a transaction is still unspent, i.e. the transaction is confirmed
+    def has_unspent_outputs(self, tx_id: str) -> bool:
+        return tx_id in self.unspent_per_tx
+
+    # calculates balance for an owner from the owner index
     def get_balance(self, owner: str) -> float:
-        balance = 0.0
-        for utxo in self.utxo_set.values():
-            if utxo["owner"] == owner:
-                balance += utxo["amount"]
-        return balance
+        return sum(amount for _, _, amount in self.get_utxos_for_owner(owner))
     
-    # returns a snapshot of the utxo set
-    def get_snapshot(self) -> Dict[Tuple[str, int], Dict[str, object]]:
-        return copy.deepcopy(self.utxo_set)
+    # returns a snapshot of the utxo set (records are immutable, so a shallow copy is enough)
+    def get_snapshot(self) -> Dict[Tuple[str, int], UTXORecord]:
+        return dict(self.utxo_set)
     
     # loads a utxo set snapshot
-    def load_snapshot(self, snapshot: Dict[Tuple[str, int], Dict[str, object]]) -> None:
-        self.utxo_set = copy.deepcopy(snapshot)
+    def load_snapshot(self, snapshot: Dict[Tuple[str, int], UTXORecord]) -> None:
+        self._replace_all(dict(snapshot))
+        self._rehash()
+
+    # streams the utxo set to disk in chunks, tagged with block height and set hash
+    def dump_snapshot(self, path: str, height: int, chunk_size: int = DEFAULT_SNAPSHOT_CHUNK) -> int:
+        header = {
+            "version": UTXO_SNAPSHOT_VERSION,
+            "height": height,
+            "set_hash": self.get_set_hash(),
+            "count": self.size(),
+            "chunk_size": chunk_size
+        }
+        
+        # write next to the target and rename, so readers never see a partial snapshot
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps(header) + "\n")
+            chunk = []
+            for (tx_id, index), data in self.items():
+                chunk.append([tx_id, index, data.amount, data.owner])
+                if len(chunk) >= chunk_size:
+                    f.write(json.dumps(chunk, separators=(",", ":")) + "\n")
+                    chunk = []
+            if chunk:
+                f.write(json.dumps(chunk, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, path)
+        
+        return header["count"]
+
+    # replaces the utxo set with a snapshot file, loading it chunk by chunk, and returns its height
+    def load_snapshot_file(self, path: str) -> int:
+        utxo_set = {}
+        total = 0
+        
+        with open(path) as f:
+            header = json.loads(f.readline())
+            if header.get("version") != UTXO_SNAPSHOT_VERSION:
+                raise ValueError(f"unsupported utxo snapshot version: {header.get('version')}")
+            
+            for line in f:
+                for tx_id, index, amount, owner in json.loads(line):
+                    utxo_set[(tx_id, index)] = UTXORecord(amount, address_id(owner))
+                    total += utxo_hash_element(tx_id, index, amount, owner)
+        
+        set_hash = f"{total % SET_HASH_MODULUS:064x}"
+        if len(utxo_set) != header["count"]:
+            raise ValueError(f"utxo snapshot truncated: expected {header['count']} utxos, found {len(utxo_set)}")
+        if set_hash != header["set_hash"]:
+            raise ValueError(f"utxo snapshot hash mismatch: expected {header['set_hash']}, computed {set_hash}")
+        
+        self._replace_all(utxo_set)
+        self.set_hash = total % SET_HASH_MODULUS
+        self.flush()
+        return header["height"]
 
-    # returns utxos for a specific owner
+    # returns utxos for a specific owner, in the order they were added, from the owner index
     def get_utxos_for_owner(self, owner: str) -> List[Tuple[str, int, float]]:
-        results = []
-        for (tx_id, index), data in self.utxo_set.items():
-            if data["owner"] == owner:
-                results.append((tx_id, index, data["amount"]))
-        return results
+        owner_id = REGISTRY.lookup(owner)
+        if owner_id is None:
+            return []
+        return [(tx_id, index, self.utxo_set[(tx_id, index)].amount) for tx_id, index in self.owner_keys.get(owner_id, ())]
+
+    # lazily yields (tx_id, index, amount, owner) for utxos matching the filters, in set order
+    def iter_utxos(
+        self,
+        owner: Optional[str] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None
+    ) -> Iterator[Tuple[str, int, float, str]]:
+        if owner is not None:
+            candidates = ((tx_id, index, amount, owner) for tx_id, index, amount in self.get_utxos_for_owner(owner))
+        else:
+            candidates = ((tx_id, index, data.amount, data.owner) for (tx_id, index), data in self.items())
+
+        for utxo in candidates:
+            if min_amount is not None and utxo[2] < min_amount:
+                continue
+            if max_amount is not None and utxo[2] > max_amount:
+                continue
+            yield utxo
+
+    # returns one page of matching utxos in outpoint order plus the cursor of the next page, the last
+    # (tx_id, index) returned (None on the last page)
+    def page_utxos(
+        self,
+        cursor: Optional[Tuple[str, int]] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        owner: Optional[str] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None
+    ) -> Tuple[List[Tuple[str, int, float, str]], Optional[Tuple[str, int]]]:
+        return paginate_by_key(self.iter_utxos(owner, min_amount, max_amount), lambda utxo: utxo[:2], cursor, limit)
+
+    # returns the n largest utxos, optionally of one owner, without sorting the whole set
+    def top_utxos(self, n: int, owner: Optional[str] = None) -> List[Tuple[str, int, float, str]]:
+        return heapq.nlargest(n, self.iter_utxos(owner), key=lambda utxo: utxo[2])
 
     # gets the amount of a specific utxo
     def get_utxo_amount(self, tx_id: str, index: int) -> float:
         key = (tx_id, index)
-        if key not in self.utxo_set:
+        data = self._lookup(key)
+        if data is None:
             raise KeyError(f"utxo {key} does not exist")
 
-        return self.utxo_set[key]["amount"]
+        return data.amount
     
     # gets the owner of a specific utxo
     def get_utxo_owner(self, tx_id: str, index: int) -> str:
+        return address_of(self.get_utxo_owner_id(tx_id, index))
+
+    # gets the address id of a specific utxo's owner
+    def get_utxo_owner_id(self, tx_id: str, index: int) -> int:
         key = (tx_id, index)
-        if key not in self.utxo_set:
+        data = self._lookup(key)
+        if data is None:
             raise KeyError(f"utxo {key} does not exist")
         
-        return self.utxo_set[key]["owner"]
+        return data.owner_id
 
-    # returns human-readable utxo set
+    # returns human-readable utxo set, listing only the first page
     def __str__(self) -> str:
-        if not self.utxo_set:
+        if self.size() == 0:
             return "utxo set is empty."
 
+        page, cursor = self.page_utxos()
         lines = ["current utxo set:"]
-        for (tx_id, index), data in sorted(self.utxo_set.items()):
+        for tx_id, index, amount, owner in page:
             lines.append(
-                f"  ({tx_id}, {index}) -> {data['amount']:.8f} btc owned by {data['owner']}"
+                f"  ({tx_id}, {index}) -> {amount:.8f} btc owned by {owner}"
             )
+        if cursor is not None:
+            lines.append(f"  ... and {self.size() - len(page)} more")
         return "\n".join(lines)
     
     # calculates total supply
     def get_total_supply(self) -> float:
-        return sum(utxo["amount"] for utxo in self.utxo_set.values())
+        return sum(utxo.amount for _, utxo in self.items())
+
+# read view of a utxo set plus pending spends and creates, used to validate a block before applying it
+class UTXOView:
+    # initializes an empty overlay over base
+    def __init__(self, base: UTXOManager):
+        self.base = base
+        self.spends: List[Tuple[str, int]] = []
+        self.spent: Set[Tuple[str, int]] = set()
+        self.created: Dict[Tuple[str, int], UTXORecord] = {}
+
+    # returns the record for an outpoint as seen through the overlay
+    def _lookup(self, key: Tuple[str, int]) -> Optional[UTXORecord]:
+        data = self.created.get(key)
+        if data is not None:
+            return data
+        if key in self.spent:
+            return None
+        return self.base._lookup(key)
+
+    # checks if a utxo exists in the overlay
+    def exists(self, tx_id: str, index: int) -> bool:
+        return self._lookup((tx_id, index)) is not None
+
+    # gets the amount of a utxo in the overlay
+    def get_utxo_amount(self, tx_id: str, index: int) -> float:
+        data = self._lookup((tx_id, index))
+        if data is None:
+            raise KeyError(f"utxo {(tx_id, index)} does not exist")
+        return data.amount
+
+    # gets the address id of a utxo's owner in the overlay
+    def get_utxo_owner_id(self, tx_id: str, index: int) -> int:
+        data = self._lookup((tx_id, index))
+        if data is None:
+            raise KeyError(f"utxo {(tx_id, index)} does not exist")
+        return data.owner_id
+
+    # gets the owner of a utxo in the overlay
+    def get_utxo_owner(self, tx_id: str, index: int) -> str:
+        return address_of(self.get_utxo_owner_id(tx_id, index))
+
+    # records a pending spend; outputs created in the overlay are simply dropped again
+    def spend(self, tx_id: str, index: int) -> None:
+        key = (tx_id, index)
+        if self.created.pop(key, None) is None:
+            self.spends.append(key)
+            self.spent.add(key)
+
+    # records a pending create
+    def create(self, tx_id: str, index: int, amount: float, owner: str) -> None:
+        self.created[(tx_id, index)] = UTXORecord(amount, address_id(owner))
+
+    # returns the pending creates in the form apply_block takes
+    def pending_creates(self) -> List[Tuple[str, int, float, str]]:
+        return [(tx_id, index, data.amount, data.owner) for (tx_id, index), data in self.created.items()]
+
+# sets up genesis utxos
+def setup_genesis_utxos(utxo_manager: UTXOManager) -> None:
+    for index, (amount, owner) in enumerate(GENESIS_OUTPUTS):
+        utxo_manager.add_utxo("genesis", index, amount, owner)